@@ -3,6 +3,22 @@
 set -o errexit
 set -o nounset
 
+# metrics of the prefork children are aggregated through these files
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus-celery-worker
+export WORKER_METRICS_PORT="${WORKER_METRICS_PORT:-9808}"
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+
+CELERY_WORKER_QUEUES="${CELERY_WORKER_QUEUES:-default,high_priority,low_priority,io}"
+if [ "${CELERY_WORKER_QUEUES}" = "io" ]; then
+  # the threads only wait on the shared event loop, which keeps all the calls in flight
+  POOL_OPTIONS="--pool=threads --concurrency=${IO_TASK_CONCURRENCY:-200}"
+else
+  # one worker per queue keeps the processes of a queue free from the backlog of the others,
+  # the pool is autoscaled within the AUTOSCALE_QUEUE_BOUNDS of its queues
+  POOL_OPTIONS="--autoscale=$(python -m apis.tasks.autoscale "${CELERY_WORKER_QUEUES}")"
+fi
+
 watchfiles \
   --filter python \
-  'celery -A main.celery worker --loglevel=info'
+  "celery -A worker.celery worker --loglevel=info -Q ${CELERY_WORKER_QUEUES} ${POOL_OPTIONS} -n ${CELERY_WORKER_QUEUES//,/-}@%h"
@@ -1,9 +1,12 @@
 from logging.config import fileConfig
 
 from alembic import context
-from apis import create_app  # new
 from apis.config import settings  # new
 from apis.database import Base  # new
+from apis.models import (  # noqa: F401  # new
+    outbox,
+    users,
+)
 from sqlalchemy import (
     engine_from_config,
     pool,
@@ -25,8 +28,6 @@ if config.config_file_name is not None:
 # target_metadata = None
 config.set_main_option("sqlalchemy.url", str(settings.DATABASE_URL))  # new
 
-fastapi_app = create_app()  # new
-
 target_metadata = Base.metadata  # new
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
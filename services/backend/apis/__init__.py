@@ -1,33 +1,16 @@
-"""Initializes the FastAPI app and includes the routers."""
+"""
+FastAPI application package.
 
-from apis.broadcast import lifespan
-from apis.celery_utils import create_celery
-from apis.logging import configure_logging
-from apis.routers.ping import ping_router
-from apis.routers.socketio import register_socketio_app
-from apis.routers.users import users_router
-from apis.routers.wesocket import ws_router
-from fastapi import FastAPI
+``create_app`` is imported on first use, so that the workers, beat and the
+migrations can import ``apis.config``, ``apis.database`` or the tasks without
+loading the web stack (FastAPI, Socket.IO, broadcaster, templates).
+"""
 
 
-def create_app() -> FastAPI:
-    """Create FastAPI application."""
-    app = FastAPI(lifespan=lifespan)
+def __getattr__(name):
+    """Import ``create_app`` lazily."""
+    if name == "create_app":
+        from apis.app import create_app  # pylint: disable=import-outside-toplevel
 
-    # configure logging
-    configure_logging()
-    # do this before loading routes
-    app.celery_app = create_celery()
-
-    # include users router
-    app.include_router(users_router)
-    # include websocket router
-    app.include_router(ws_router)
-
-    # include socketio
-    register_socketio_app(app)
-
-    # include ping route'
-    app.include_router(ping_router)
-
-    return app
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,6 +1,14 @@
 """Websocket broadcast service."""
 
+import asyncio
+import json
 from contextlib import asynccontextmanager  # type: ignore
+from typing import (
+    AsyncIterator,
+    Dict,
+    Set,
+    Tuple,
+)
 
 from apis.config import settings
 from broadcaster import Broadcast
@@ -9,6 +17,81 @@ from fastapi import FastAPI
 broadcast = Broadcast(settings.WS_MESSAGE_QUEUE)
 
 
+class TaskStatusHub:
+    """
+    Registry of local watchers of task status channels.
+
+    The hub holds a single broadcast subscription per watched task id, however many
+    sockets watch it, decodes each message once and fans it out to the queues of
+    the local watchers. The subscription is dropped as soon as the last watcher
+    leaves, including when its socket disconnected with an error.
+    """
+
+    def __init__(self, broadcast_service: Broadcast):
+        self._broadcast = broadcast_service
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pumps: Dict[str, Tuple[asyncio.Task, asyncio.Event, asyncio.Event]] = {}
+
+    @property
+    def watcher_count(self) -> int:
+        """Return the number of local watchers."""
+        return sum(len(watchers) for watchers in self._watchers.values())
+
+    @property
+    def subscription_count(self) -> int:
+        """Return the number of task ids with a broadcast subscription."""
+        return len(self._pumps)
+
+    @asynccontextmanager
+    async def watch(self, task_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Yield a queue receiving the status payloads published for ``task_id``."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._watchers.setdefault(task_id, set()).add(queue)
+        try:
+            if task_id not in self._pumps:
+                subscribed, stop = asyncio.Event(), asyncio.Event()
+                pump = asyncio.create_task(self._pump(task_id, subscribed, stop))
+                self._pumps[task_id] = (pump, subscribed, stop)
+            pump, subscribed, _ = self._pumps[task_id]
+            # wait for the subscription so no update is missed after the caller reads the state
+            waiter = asyncio.ensure_future(subscribed.wait())
+            await asyncio.wait({pump, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if pump.done():
+                pump.result()
+            yield queue
+        finally:
+            watchers = self._watchers[task_id]
+            watchers.discard(queue)
+            if not watchers:
+                del self._watchers[task_id]
+                pump, _, stop = self._pumps.pop(task_id)
+                stop.set()
+                await asyncio.gather(pump, return_exceptions=True)
+
+    async def _pump(self, task_id: str, subscribed: asyncio.Event, stop: asyncio.Event):
+        """Forward the messages of one channel until the last watcher leaves."""
+        async with self._broadcast.subscribe(channel=task_id) as subscriber:
+            subscribed.set()
+            stopped = asyncio.ensure_future(stop.wait())
+            try:
+                while True:
+                    received = asyncio.ensure_future(subscriber.get())
+                    await asyncio.wait({received, stopped}, return_when=asyncio.FIRST_COMPLETED)
+                    if stopped.done():
+                        # leave the context normally so broadcaster unsubscribes the channel
+                        received.cancel()
+                        break
+                    payload = json.loads(received.result().message)
+                    for queue in self._watchers.get(task_id, ()):
+                        queue.put_nowait(payload)
+            finally:
+                stopped.cancel()
+
+
+task_status_hub = TaskStatusHub(broadcast)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):  # pylint: disable=unused-argument
     """Connect and disconnect to the broadcast service."""
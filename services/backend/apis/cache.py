@@ -0,0 +1,220 @@
+"""Two-tier read-through cache of the users, shared by the API and the workers."""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from apis.celery_utils import get_redis_client
+from apis.config import settings
+from apis.database import db_read_context
+from apis.metrics import USER_CACHE_LOOKUPS
+from apis.models.users import User
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+# fields the users are looked up by, all unique
+USER_CACHE_FIELDS = ("id", "username", "email")
+
+
+class UserRecord(NamedTuple):
+    """Cached columns of a user."""
+
+    id: int
+    username: str
+    email: str
+
+    @classmethod
+    def from_user(cls, user: Any) -> "UserRecord":
+        """Build a record from a ``User`` row."""
+        return cls(user.id, user.username, user.email)
+
+
+UserLoader = Callable[[str, List[Any]], Awaitable[Iterable[Any]]]
+
+
+async def read_users(field: str, values: List[Any]) -> Iterable[User]:
+    """Load the users whose ``field`` is in ``values``, from the read session of the API."""
+    async with db_read_context() as session:
+        return list(await session.scalars(select(User).where(getattr(User, field).in_(values))))
+
+
+class UserCache:
+    """
+    Read-through cache of ``User`` lookups by id, username or email.
+
+    Lookups go through an in-process LRU (``local_ttl`` seconds), then Redis
+    (``ttl`` seconds), then the database with the given loader. Missing users
+    are cached too, for ``negative_ttl`` seconds. Concurrent lookups of the same
+    key in a process share one load. :meth:`set` and :meth:`invalidate` must be
+    called after a user is inserted or updated; the LRUs of the other processes
+    catch up within ``local_ttl``. Lookups fall through to the loader while
+    Redis is unavailable.
+    """
+
+    def __init__(self, maxsize: int, local_ttl: float, ttl: int, negative_ttl: int, prefix: str = "user"):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self._entries: OrderedDict = OrderedDict()
+        # loads in progress of each event loop, keyed like the entries
+        self._loads: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        """Get the Redis client of the running loop."""
+        return get_redis_client(settings.USER_CACHE_URL)
+
+    def key(self, field: str, value: Any) -> str:
+        """Return the key of a lookup."""
+        return f"{self.prefix}:{field}:{value}"
+
+    def _get_local(self, key: str) -> Tuple[bool, Optional[UserRecord]]:
+        """Return whether the key is in the LRU, and its record."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, record
+
+    def _set_local(self, key: str, record: Optional[UserRecord]):
+        """Store a record, or a miss, in the LRU."""
+        self._entries[key] = (time.monotonic() + self.local_ttl, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(self, field: str, value: Any, loader: UserLoader = read_users) -> Optional[UserRecord]:
+        """Return the user whose ``field`` is ``value``, or None."""
+        return (await self.get_many(field, [value], loader))[value]
+
+    async def get_many(
+        self, field: str, values: Iterable[Any], loader: UserLoader = read_users
+    ) -> Dict[Any, Optional[UserRecord]]:
+        """Return the users whose ``field`` is in ``values``, keyed by value, None for the missing ones."""
+        found: Dict[Any, Optional[UserRecord]] = {}
+        keys = {value: self.key(field, value) for value in dict.fromkeys(values)}
+
+        missing = []
+        for value, key in keys.items():
+            cached, record = self._get_local(key)
+            if cached:
+                found[value] = record
+            else:
+                missing.append(value)
+        USER_CACHE_LOOKUPS.labels("local").inc(len(found))
+        if not missing:
+            return found
+
+        try:
+            payloads = await self.client.mget([keys[value] for value in missing])
+        except RedisError:
+            logger.warning("Cannot read the user cache, loading the users", exc_info=True)
+            payloads = [None] * len(missing)
+        remote = 0
+        for value, payload in zip(missing, payloads, strict=True):
+            if payload is not None:
+                data = json.loads(payload)
+                found[value] = UserRecord(*data) if data else None
+                self._set_local(keys[value], found[value])
+                remote += 1
+        USER_CACHE_LOOKUPS.labels("redis").inc(remote)
+        missing = [value for value in missing if value not in found]
+        if missing:
+            found.update(await self._load(field, missing, keys, loader))
+        return found
+
+    async def _load(
+        self, field: str, values: List[Any], keys: Dict[Any, str], loader: UserLoader
+    ) -> Dict[Any, Optional[UserRecord]]:
+        """Load the users missing from both tiers, joining the loads already in progress."""
+        loop = asyncio.get_running_loop()
+        loads = self._loads.setdefault(loop, {})
+        joined = {value: loads[keys[value]] for value in values if keys[value] in loads}
+        owned = {value: loop.create_future() for value in values if value not in joined}
+        for value, future in owned.items():
+            loads[keys[value]] = future
+
+        if owned:
+            USER_CACHE_LOOKUPS.labels("database").inc(len(owned))
+            try:
+                rows = await loader(field, list(owned))
+                records = {getattr(row, field): UserRecord.from_user(row) for row in rows}
+                await self._store({keys[value]: records.get(value) for value in owned})
+            except BaseException as exc:
+                for future in owned.values():
+                    future.set_exception(exc)
+                    # raised here, and again only by the lookups which joined
+                    future.exception()
+                raise
+            finally:
+                for value in owned:
+                    loads.pop(keys[value], None)
+            for value, future in owned.items():
+                future.set_result(records.get(value))
+        results = {value: future.result() for value, future in owned.items()}
+        for value, future in joined.items():
+            results[value] = await asyncio.shield(future)
+        return results
+
+    async def _store(self, records: Dict[str, Optional[UserRecord]]):
+        """Store records, or misses, in both tiers."""
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, record in records.items():
+                    pipe.set(key, json.dumps(record), ex=self.ttl if record else self.negative_ttl)
+                await pipe.execute()
+        except RedisError:
+            logger.warning("Cannot write the user cache", exc_info=True)
+        for key, record in records.items():
+            self._set_local(key, record)
+
+    async def set(self, *records: UserRecord):
+        """Cache users just inserted or updated, replacing the misses cached for their keys."""
+        await self._store(
+            {self.key(field, getattr(record, field)): record for record in records for field in USER_CACHE_FIELDS}
+        )
+
+    async def invalidate(self, *records: UserRecord):
+        """Drop users from the cache, e.g. with their values before an update."""
+        keys = [self.key(field, getattr(record, field)) for record in records for field in USER_CACHE_FIELDS]
+        if keys:
+            try:
+                await self.client.delete(*keys)
+            except RedisError:
+                logger.warning("Cannot invalidate the user cache", exc_info=True)
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear_local(self):
+        """Empty the in-process tier."""
+        self._entries.clear()
+
+
+user_cache = UserCache(
+    settings.USER_CACHE_SIZE,
+    settings.USER_CACHE_LOCAL_TTL,
+    settings.USER_CACHE_TTL,
+    settings.USER_CACHE_NEGATIVE_TTL,
+)
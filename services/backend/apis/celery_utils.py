@@ -1,31 +1,232 @@
 """Celery configuration."""
 
+import asyncio
+import functools
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Dict,
+    Iterable,
+)
+
+import redis.asyncio as aioredis
 from apis.config import settings
+from apis.utils import chunked
 from celery import current_app as current_celery_app
+from celery import states
+from celery.backends.redis import RedisBackend
+from celery.canvas import Signature
 from celery.result import AsyncResult
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# custom state of the running tasks reporting their progress
+PROGRESS = "PROGRESS"
 
 
 def create_celery():
     """Create a Celery app."""
     celery_app = current_celery_app
     celery_app.config_from_object(settings, namespace="CELERY")
+    # apply the result policy of CELERY_TASK_ANNOTATIONS when storing results in Redis
+    celery_app.loader.override_backends = {
+        "redis": "apis.tasks.results:ResultPolicyRedisBackend",
+        "rediss": "apis.tasks.results:ResultPolicyRedisBackend",
+    }
 
     return celery_app
 
 
+class EnqueueStats:
+    """Counters of the time spent publishing tasks from the API."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float):
+        """Record the latency of one publish."""
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+enqueue_stats = EnqueueStats()
+
+# kombu publishes synchronously, so they run on threads sharing the app's producer pool
+_enqueue_executor = ThreadPoolExecutor(max_workers=settings.ENQUEUE_THREADS, thread_name_prefix="celery-enqueue")
+
+
+async def enqueue(signature: Signature, **options) -> AsyncResult:
+    """
+    Publish a task signature without blocking the event loop.
+
+    A slow broker or a reconnect only holds one of the enqueue threads, so the
+    other requests of the worker keep being served.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_enqueue_executor, functools.partial(signature.apply_async, **options))
+    finally:
+        elapsed = time.perf_counter() - started
+        enqueue_stats.observe(elapsed)
+        if elapsed > settings.ENQUEUE_SLOW_THRESHOLD:
+            logger.warning("Slow enqueue of %s: %.3fs", signature.task, elapsed)
+
+
+def task_status_payload(state, result):
+    """Build the status payload sent to clients from a task state and result."""
+    if state == "FAILURE":
+        return {
+            "state": state,
+            "error": str(result),
+        }
+    if state == PROGRESS and isinstance(result, dict):
+        return {
+            "state": state,
+            "progress": result.get("progress"),
+            "meta": result.get("meta", {}),
+        }
+    return {
+        "state": state,
+    }
+
+
 def get_task_info(task_id):
     """Return task info according to the task_id."""
     task = AsyncResult(task_id)
     state = task.state
 
-    if state == "FAILURE":
-        error = str(task.result)
-        response = {
-            "state": task.state,
-            "error": error,
-        }
+    if state in ("FAILURE", PROGRESS):
+        return task_status_payload(state, task.result)
+    return task_status_payload(state, None)
+
+
+class TerminalStateCache:
+    """
+    In-process TTL/LRU cache of task status payloads.
+
+    Only ready states (SUCCESS, FAILURE, REVOKED) are stored since they never
+    change, so a cached entry can never hide a later transition.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, task_id):
+        """Return the cached payload of a task, or None."""
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            del self._entries[task_id]
+            return None
+        self._entries.move_to_end(task_id)
+        return payload
+
+    def set(self, task_id, payload):
+        """Cache the payload of a task if its state is final."""
+        if payload["state"] not in states.READY_STATES:
+            return
+        self._entries[task_id] = (time.monotonic() + self.ttl, payload)
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached entry."""
+        self._entries.clear()
+
+
+task_state_cache = TerminalStateCache(settings.TASK_STATUS_CACHE_SIZE, settings.TASK_STATUS_CACHE_TTL)
+
+# redis.asyncio connections are bound to the loop that opened them
+_redis_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_redis_client(url: str) -> aioredis.Redis:
+    """Get the pooled async Redis client of ``url`` for the running loop."""
+    clients = _redis_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(url)
+    if client is None:
+        client = aioredis.Redis.from_url(url, max_connections=settings.RESULT_BACKEND_MAX_CONNECTIONS)
+        clients[url] = client
+    return client
+
+
+def get_result_backend_client() -> aioredis.Redis:
+    """Get the pooled async Redis client of the result backend for the running loop."""
+    return get_redis_client(settings.CELERY_RESULT_BACKEND)
+
+
+def decode_task_info(backend, payload):
+    """Return task info from a raw result backend value."""
+    if not payload:
+        return task_status_payload(states.PENDING, None)
+    meta = backend.decode_result(payload)
+    return task_status_payload(meta["status"], meta["result"])
+
+
+async def get_task_info_async(task_id):
+    """Return task info according to the task_id without blocking the event loop."""
+    response = task_state_cache.get(task_id)
+    if response is not None:
+        return response
+
+    backend = current_celery_app.backend
+    if isinstance(backend, RedisBackend):
+        payload = await get_result_backend_client().get(backend.get_key_for_task(task_id))
+        response = decode_task_info(backend, payload)
     else:
-        response = {
-            "state": task.state,
-        }
+        response = await run_in_threadpool(get_task_info, task_id)
+
+    task_state_cache.set(task_id, response)
+    return response
+
+
+async def get_tasks_info_async(
+    task_ids: Iterable[str], chunk_size: int = settings.TASK_STATUS_BULK_CHUNK_SIZE
+) -> Dict:
+    """
+    Return the task info of many tasks, keyed by task id.
+
+    Uncached ids are read with one MGET per chunk of ``chunk_size`` ids, all
+    sent in a single pipeline, so a batch costs one round trip to Redis.
+    """
+    response = {}
+    missing = []
+    for task_id in dict.fromkeys(task_ids):
+        cached = task_state_cache.get(task_id)
+        if cached is not None:
+            response[task_id] = cached
+        else:
+            missing.append(task_id)
+    if not missing:
+        return response
+
+    backend = current_celery_app.backend
+    if not isinstance(backend, RedisBackend):
+        for task_id in missing:
+            response[task_id] = await get_task_info_async(task_id)
+        return response
+
+    chunks = list(chunked(missing, chunk_size))
+    async with get_result_backend_client().pipeline(transaction=False) as pipe:
+        for chunk in chunks:
+            pipe.mget([backend.get_key_for_task(task_id) for task_id in chunk])
+        results = await pipe.execute()
+
+    for chunk, payloads in zip(chunks, results, strict=True):
+        for task_id, payload in zip(chunk, payloads, strict=True):
+            response[task_id] = decode_task_info(backend, payload)
+            task_state_cache.set(task_id, response[task_id])
     return response
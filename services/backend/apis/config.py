@@ -5,30 +5,132 @@ from functools import lru_cache
 from typing import (
     Any,
     Dict,
+    Tuple,
 )
 
 from kombu import Queue
 
+# queues of the tasks whose name has no queue prefix, e.g. to keep the names already stored in the outbox
+TASK_NAME_QUEUES: Dict[str, str] = {
+    # batched per-user tasks, the batches fill up with the concurrent tasks of the io worker
+    "apis.tasks.users.task_send_welcome_email": "io",
+    "apis.tasks.users.task_add_subscribe": "io",
+}
 
-def route_task(name: str) -> Dict[str, Any]:  # noqa # pylint:  disable=unused-argument
+
+def route_task(  # noqa # pylint:  disable=unused-argument
+    name: str, args, kwargs, options, task=None, **kw
+) -> Dict[str, Any]:
     """Route tasks to different queues based on the task name."""
+    if name in TASK_NAME_QUEUES:
+        return {"queue": TASK_NAME_QUEUES[name]}
     if ":" in name:
         queue, _ = name.split(":")
         return {"queue": queue}
     return {"queue": "default"}
 
 
+def parse_rate_limits(value: str) -> Dict[str, Tuple[int, float]]:
+    """Parse ``logger=records/seconds`` pairs separated by commas."""
+    limits = {}
+    for rule in filter(None, (rule.strip() for rule in value.split(","))):
+        name, limit = rule.split("=")
+        records, seconds = limit.split("/")
+        limits[name.strip()] = (int(records), float(seconds))
+    return limits
+
+
 class BaseConfig:
     """Base configuration settings."""
 
     BASE_DIR: pathlib.Path = pathlib.Path(__file__).parent.parent
     DATABASE_URL: str = os.environ.get("DATABASE_URL", f"sqlite:///{BASE_DIR}/db.sqlite3")  # noqa
     DATABASE_CONNECT_DICT: dict = {}
+    # Optional read replica for read-only queries
+    DATABASE_REPLICA_URL: str = os.environ.get("DATABASE_REPLICA_URL", "")
+    # Database pool of each API process
+    DATABASE_POOL_SIZE: int = int(os.environ.get("DATABASE_POOL_SIZE", "10"))
+    DATABASE_MAX_OVERFLOW: int = int(os.environ.get("DATABASE_MAX_OVERFLOW", "10"))
+    DATABASE_POOL_TIMEOUT: float = float(os.environ.get("DATABASE_POOL_TIMEOUT", "30"))
+    DATABASE_POOL_RECYCLE: int = int(os.environ.get("DATABASE_POOL_RECYCLE", "1800"))
+    DATABASE_POOL_PRE_PING: bool = os.environ.get("DATABASE_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    # asyncpg caches, set to 0 behind PgBouncer in transaction mode
+    DATABASE_STATEMENT_CACHE_SIZE: int = int(os.environ.get("DATABASE_STATEMENT_CACHE_SIZE", "100"))
+    DATABASE_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.environ.get("DATABASE_PREPARED_STATEMENT_CACHE_SIZE", "100"))
+    # Database pool of each Celery worker process
+    WORKER_DATABASE_POOL_SIZE: int = int(os.environ.get("WORKER_DATABASE_POOL_SIZE", "5"))
+    WORKER_DATABASE_MAX_OVERFLOW: int = int(os.environ.get("WORKER_DATABASE_MAX_OVERFLOW", "5"))
     # Celery
     CELERY_BROKER_URL: str = os.environ.get("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")  # NEW
     CELERY_RESULT_BACKEND: str = os.environ.get("CELERY_RESULT_BACKEND", "redis://127.0.0.1:6379/0")  # NEW
+    # Default TTL of the stored results, tasks can set their own with the result_expires annotation
+    CELERY_RESULT_EXPIRES: int = int(os.environ.get("CELERY_RESULT_EXPIRES", "86400"))
+    # Compact (msgpack) results larger than this are zlib compressed
+    RESULT_COMPRESSION_THRESHOLD: int = int(os.environ.get("RESULT_COMPRESSION_THRESHOLD", "1024"))
+    # Publishing tasks from async routes
+    CELERY_BROKER_POOL_LIMIT: int = int(os.environ.get("CELERY_BROKER_POOL_LIMIT", "10"))
+    ENQUEUE_THREADS: int = int(os.environ.get("ENQUEUE_THREADS", "10"))
+    ENQUEUE_SLOW_THRESHOLD: float = float(os.environ.get("ENQUEUE_SLOW_THRESHOLD", "0.5"))
+    # Port of the metrics server of the Celery workers, 0 to disable it
+    WORKER_METRICS_PORT: int = int(os.environ.get("WORKER_METRICS_PORT", "0"))
     # WebSockets
     WS_MESSAGE_QUEUE: str = os.environ.get("WS_MESSAGE_QUEUE", "redis://127.0.0.1:6379/0")
+    # Socket.IO and Engine.IO log every event and packet when enabled
+    SOCKETIO_LOGGER: bool = os.environ.get("SOCKETIO_LOGGER", "false").lower() in ("1", "true", "yes")
+    ENGINEIO_LOGGER: bool = os.environ.get("ENGINEIO_LOGGER", "false").lower() in ("1", "true", "yes")
+    # "msgpack" packs the packets and the manager messages with msgpack, browsers then need socket.io-msgpack-parser
+    SOCKETIO_SERIALIZER: str = os.environ.get("SOCKETIO_SERIALIZER", "default")
+    # Compression of the HTTP long-polling responses larger than the threshold (bytes)
+    SOCKETIO_HTTP_COMPRESSION: bool = os.environ.get("SOCKETIO_HTTP_COMPRESSION", "true").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    SOCKETIO_COMPRESSION_THRESHOLD: int = int(os.environ.get("SOCKETIO_COMPRESSION_THRESHOLD", "1024"))
+    # Logging: "text" or "json" records, written by a background thread when LOG_QUEUE is set
+    LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.environ.get("LOG_FORMAT", "text")
+    LOG_QUEUE: bool = os.environ.get("LOG_QUEUE", "false").lower() in ("1", "true", "yes")
+    # Records below WARNING let through per message of the chatty loggers (and their children)
+    LOG_RATE_LIMITS: dict = parse_rate_limits(
+        os.environ.get("LOG_RATE_LIMITS", "engineio=10/1,socketio=10/1,apis.tasks.heartbeat=1/60")
+    )
+    # Task status lookups from the API
+    RESULT_BACKEND_MAX_CONNECTIONS: int = int(os.environ.get("RESULT_BACKEND_MAX_CONNECTIONS", "50"))
+    TASK_STATUS_CACHE_SIZE: int = int(os.environ.get("TASK_STATUS_CACHE_SIZE", "10000"))
+    TASK_STATUS_CACHE_TTL: int = int(os.environ.get("TASK_STATUS_CACHE_TTL", "300"))
+    TASK_STATUS_BULK_MAX_IDS: int = int(os.environ.get("TASK_STATUS_BULK_MAX_IDS", "10000"))
+    TASK_STATUS_BULK_CHUNK_SIZE: int = int(os.environ.get("TASK_STATUS_BULK_CHUNK_SIZE", "500"))
+    # Longest wait (seconds) of a long-poll status request
+    TASK_STATUS_MAX_WAIT: float = float(os.environ.get("TASK_STATUS_MAX_WAIT", "30"))
+    # Shortest interval between two progress reports of a task, the reports in between are dropped
+    TASK_PROGRESS_INTERVAL_MS: int = int(os.environ.get("TASK_PROGRESS_INTERVAL_MS", "500"))
+    # Bulk user imports
+    USER_BULK_CHUNK_SIZE: int = int(os.environ.get("USER_BULK_CHUNK_SIZE", "1000"))
+    # Rows read per keyset query of the user exports
+    USER_EXPORT_BATCH_SIZE: int = int(os.environ.get("USER_EXPORT_BATCH_SIZE", "5000"))
+    # Export jobs: ids per chunk exported by one task, and where the parts and artifacts are written
+    USER_EXPORT_CHUNK_IDS: int = int(os.environ.get("USER_EXPORT_CHUNK_IDS", "100000"))
+    EXPORT_DIR: str = os.environ.get("EXPORT_DIR", str(BASE_DIR / "exports"))
+    # Retries of the tasks calling external services: exponential backoff with full jitter
+    RETRY_BACKOFF: int = int(os.environ.get("RETRY_BACKOFF", "5"))
+    RETRY_BACKOFF_MAX: int = int(os.environ.get("RETRY_BACKOFF_MAX", "600"))
+    # Circuit breaker per downstream host, its state is kept in the broker Redis
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = int(os.environ.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_BREAKER_FAILURE_WINDOW: float = float(os.environ.get("CIRCUIT_BREAKER_FAILURE_WINDOW", "60"))
+    CIRCUIT_BREAKER_RESET_TIMEOUT: float = float(os.environ.get("CIRCUIT_BREAKER_RESET_TIMEOUT", "30"))
+    # Batches of the per-user tasks: at most this many users, collected for at most this many seconds
+    USER_TASK_BATCH_SIZE: int = int(os.environ.get("USER_TASK_BATCH_SIZE", "100"))
+    USER_TASK_BATCH_WAIT: float = float(os.environ.get("USER_TASK_BATCH_WAIT", "0.05"))
+    # Read-through cache of the users: in-process LRU, then Redis, shared by the API and the workers
+    USER_CACHE_URL: str = os.environ.get("USER_CACHE_URL", "redis://127.0.0.1:6379/0")
+    USER_CACHE_SIZE: int = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_LOCAL_TTL: float = float(os.environ.get("USER_CACHE_LOCAL_TTL", "5"))
+    USER_CACHE_TTL: int = int(os.environ.get("USER_CACHE_TTL", "300"))
+    USER_CACHE_NEGATIVE_TTL: int = int(os.environ.get("USER_CACHE_NEGATIVE_TTL", "10"))
+    # Celery outbox relay
+    OUTBOX_BATCH_SIZE: int = int(os.environ.get("OUTBOX_BATCH_SIZE", "500"))
+    OUTBOX_POLL_INTERVAL: float = float(os.environ.get("OUTBOX_POLL_INTERVAL", "0.5"))
 
     CELERY_BEAT_SCHEDULE: dict = {
         "task-schedule-work": {
@@ -37,6 +139,11 @@ class BaseConfig:
         },
     }
     CELERY_TASK_DEFAULT_QUEUE: str = "default"
+    # task modules loaded by the workers and beat, which do not import the routers
+    CELERY_IMPORTS: tuple = (
+        "apis.tasks.export",
+        "apis.tasks.users",
+    )
 
     # Force all queues to be explicitly listed in `CELERY_TASK_QUEUES` to help prevent typos
     CELERY_TASK_CREATE_MISSING_QUEUES: bool = False
@@ -46,10 +153,40 @@ class BaseConfig:
         Queue("default"),
         Queue("high_priority"),
         Queue("low_priority"),
+        # HTTP bound async tasks, served by a threads pool awaiting them on one event loop
+        Queue("io"),
     )
     # dynamic routing
     CELERY_TASK_ROUTES: tuple = (route_task,)
 
+    # Autoscaling from the queue depths, enabled by starting the worker with --autoscale
+    CELERY_WORKER_AUTOSCALER: str = "apis.tasks.autoscale:QueueDepthAutoscaler"
+    # (min, max) processes per queue, the minimum is reserved even when the queue is empty
+    AUTOSCALE_QUEUE_BOUNDS: dict = {
+        "high_priority": (2, 8),
+        "default": (1, 8),
+        "low_priority": (0, 4),
+        # only used when io is served by a prefork worker along other queues
+        "io": (1, 4),
+    }
+    AUTOSCALE_TASKS_PER_PROCESS: int = int(os.environ.get("AUTOSCALE_TASKS_PER_PROCESS", "4"))
+    # oldest message wait (seconds) after which a queue gets its maximum processes
+    AUTOSCALE_MAX_WAIT: float = float(os.environ.get("AUTOSCALE_MAX_WAIT", "5"))
+    # In-flight tasks of the worker of the io queue, and outbound connections of each worker process
+    IO_TASK_CONCURRENCY: int = int(os.environ.get("IO_TASK_CONCURRENCY", "200"))
+
+    # Result policy per task: ignore_result, or store with its own result_expires (seconds)
+    # and result_compact to use msgpack instead of JSON
+    CELERY_TASK_ANNOTATIONS: dict = {
+        "task_schedule_work": {"ignore_result": True},
+        "default:dynamic_example_one": {"ignore_result": True},
+        "low_priority:dynamic_example_two": {"ignore_result": True},
+        "high_priority:dynamic_example_three": {"ignore_result": True},
+        # polled by the form example, so only the state is kept, briefly
+        "io:sample_task": {"result_expires": 3600},
+        "apis.tasks.users.divide": {"result_expires": 3600, "result_compact": True},
+    }
+
 
 class DevelopmentConfig(BaseConfig):
     """Development configuration settings."""
@@ -72,6 +209,7 @@ class TestingConfig(BaseConfig):
     CELERY_BROKER_URL: str = "redis://redis:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://redis:6379/0"
     WS_MESSAGE_QUEUE: str = "redis://redis:6379/0"
+    USER_CACHE_URL: str = "redis://redis:6379/0"
 
     # You might want to adjust these for testing
     CELERY_TASK_ALWAYS_EAGER: bool = (
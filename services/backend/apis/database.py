@@ -1,9 +1,14 @@
 """Database configuration and session management."""
 
 from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    Dict,
+)
 
 from apis.config import settings
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     create_async_engine,
 )
@@ -12,23 +17,64 @@ from sqlalchemy.orm import (
     sessionmaker,
 )
 
+
+def to_async_url(url: str) -> str:
+    """Use the asyncpg driver for PostgreSQL URLs."""
+    return url.replace("postgresql://", "postgresql+asyncpg://")
+
+
 # Update the DATABASE_URL to use the async driver
 # Replace postgresql:// with postgresql+asyncpg://
-async_database_url = settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
+async_database_url = to_async_url(settings.DATABASE_URL)
+async_replica_url = to_async_url(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
+
+
+def engine_options(url: str, pool_size: int, max_overflow: int) -> Dict[str, Any]:
+    """Build the pool and driver options of an engine from the settings."""
+    options: Dict[str, Any] = {"connect_args": dict(settings.DATABASE_CONNECT_DICT)}
+    if url.startswith("sqlite"):
+        # SQLite gets a NullPool or a single connection, so there is nothing to size
+        return options
+    options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+    )
+    if url.startswith("postgresql+asyncpg"):
+        options["connect_args"].setdefault("statement_cache_size", settings.DATABASE_STATEMENT_CACHE_SIZE)
+        options["connect_args"].setdefault(
+            "prepared_statement_cache_size", settings.DATABASE_PREPARED_STATEMENT_CACHE_SIZE
+        )
+    return options
+
+
+def create_engine_pair(pool_size: int, max_overflow: int):
+    """Create the primary engine and the engine used for reads."""
+    primary = create_async_engine(async_database_url, **engine_options(async_database_url, pool_size, max_overflow))
+    if async_replica_url is None:
+        return primary, primary
+    replica = create_async_engine(async_replica_url, **engine_options(async_replica_url, pool_size, max_overflow))
+    return primary, replica
 
-# Create async engine
-engine = create_async_engine(
-    async_database_url,
-    # Remove connect_args if they're not needed for asyncpg
-    # If you do need to pass any connect args, make sure they're compatible with asyncpg
-)
 
-# Create async session
+# Create async engines, the read engine is the primary one unless a replica is configured
+engine, read_engine = create_engine_pair(settings.DATABASE_POOL_SIZE, settings.DATABASE_MAX_OVERFLOW)
+
+# Create async sessions
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+AsyncReadSessionLocal = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
 
 
+async def dispose_engines(*engines: AsyncEngine):
+    """Close the pooled connections of the given engines."""
+    for pooled_engine in dict.fromkeys(engines):
+        await pooled_engine.dispose()
+
+
 async def get_db_session():
     """Get a database session."""
     async with AsyncSessionLocal() as session:
@@ -38,4 +84,14 @@ async def get_db_session():
             await session.close()
 
 
+async def get_db_read_session():
+    """Get a database session for read-only queries, served by the replica if any."""
+    async with AsyncReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 db_context = asynccontextmanager(get_db_session)
+db_read_context = asynccontextmanager(get_db_read_session)
@@ -0,0 +1,110 @@
+"""Keyset-paginated reads and serialization of the users export, shared by the API and the workers."""
+
+import base64
+import binascii
+import csv
+import io
+import json
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from apis.models.users import User
+from apis.schemas.users import UserExportFilters
+from pydantic import ValidationError
+from sqlalchemy import (
+    Select,
+    select,
+)
+from sqlalchemy.engine import Row
+
+EXPORT_COLUMNS = ("id", "username", "email")
+EXPORT_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_query(filters: UserExportFilters, after: int, until: Optional[int], limit: int) -> Select:
+    """Select the next ``limit`` rows with an id above ``after``, up to ``until``, as plain tuples."""
+    query = select(User.id, User.username, User.email).where(User.id > after)
+    if until is not None:
+        query = query.where(User.id <= until)
+    if filters.username_prefix:
+        query = query.where(User.username.startswith(filters.username_prefix, autoescape=True))
+    if filters.email_domain:
+        query = query.where(User.email.endswith(f"@{filters.email_domain}", autoescape=True))
+    return query.order_by(User.id).limit(limit)
+
+
+async def iter_user_batches(
+    session_factory: Callable,
+    filters: UserExportFilters,
+    batch_size: int,
+    after: int = 0,
+    until: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> AsyncIterator[List[Row]]:
+    """
+    Yield the users matching ``filters`` by increasing id, in batches of ``batch_size`` rows.
+
+    Each batch is one indexed range query on ``users.id`` in its own session,
+    so no connection or snapshot is held while the caller handles a batch.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        async with session_factory() as session:
+            rows = (await session.execute(export_query(filters, after, until, size))).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < size:
+            return
+        after = rows[-1].id
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def format_header(export_format: str) -> str:
+    """Return the text preceding the rows."""
+    return ",".join(EXPORT_COLUMNS) + "\r\n" if export_format == "csv" else ""
+
+
+def format_rows(rows: Sequence[Sequence[Any]], export_format: str) -> str:
+    """Serialize a batch of rows as NDJSON lines or CSV records."""
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row, strict=True))) + "\n" for row in rows)
+
+
+def format_next_cursor(token: str, export_format: str) -> str:
+    """Return the trailer of an export stopped before its last row, carrying the cursor to resume from."""
+    if export_format == "csv":
+        # the records start with the id, so the trailer cannot be mistaken for one
+        return f"#next_cursor={token}\r\n"
+    return json.dumps({"next_cursor": token}) + "\n"
+
+
+def encode_cursor(after: int, filters: UserExportFilters) -> str:
+    """Encode the position of an export and its filters as an opaque token."""
+    payload = json.dumps({"after": after, "filters": filters.model_dump(exclude_none=True)})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[int, UserExportFilters]:
+    """Return the position and filters of a cursor token, raising ValueError on invalid tokens."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        after = payload["after"]
+        filters = UserExportFilters.model_validate(payload["filters"])
+    except (binascii.Error, ValueError, TypeError, KeyError, ValidationError) as e:
+        raise ValueError("Invalid export cursor") from e
+    if not isinstance(after, int):
+        raise ValueError("Invalid export cursor")
+    return after, filters
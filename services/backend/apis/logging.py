@@ -1,28 +1,171 @@
 """Logging configuration for the project."""
 
+import atexit
+import copy
+import json
 import logging
 import logging.config
+import os
+import queue
+import threading
+import time
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+)
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
+from apis.config import settings
 
-def configure_logging():
-    """Configure logging for the project."""
+# attributes of every record, the others were passed with ``extra``
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# the handler and listener of the queued mode, if enabled
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with the ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format the record as JSON."""
+        payload: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": f"{record.pathname}:{record.lineno}",
+            "process": record.process,
+        }
+        payload.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most ``records`` records per ``seconds`` of each message of the limited loggers.
+
+    ``limits`` maps a logger name to its (records, seconds) limit, which also
+    applies to its children. Messages are told apart by their format string, so
+    one chatty message does not hide the others. Records of WARNING and above
+    are never dropped, and the first record let through after some were dropped
+    carries their number in ``suppressed``.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]]):
+        super().__init__()
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._logger_limits: Dict[str, Optional[Tuple[int, float]]] = {}
+        # (logger, message) -> [window start, records let through, records dropped]
+        self._windows: Dict[Tuple[str, Any], List[float]] = {}
+
+    def limit_of(self, name: str) -> Optional[Tuple[int, float]]:
+        """Return the limit of a logger, inherited from its closest limited parent."""
+        if name not in self._logger_limits:
+            parts = name.split(".")
+            parents = (".".join(parts[:end]) for end in range(len(parts), 0, -1))
+            self._logger_limits[name] = next(
+                (self.limits[parent] for parent in parents if parent in self.limits), None
+            )
+        return self._logger_limits[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Drop the record if its message is over its limit."""
+        limit = self.limit_of(record.name)
+        if limit is None or record.levelno >= logging.WARNING:
+            return True
+        records, seconds = limit
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault((record.name, record.msg), [now, 0, 0])
+            if now - window[0] >= seconds:
+                if window[2]:
+                    record.suppressed = window[2]
+                window[:] = [now, 0, 0]
+            if window[1] >= records:
+                window[2] += 1
+                return False
+            window[1] += 1
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """Queue handler leaving the formatting to the handlers of the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the arguments and the traceback, which may not be picklable, into the record."""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(
+    log_format: Optional[str] = None,
+    use_queue: Optional[bool] = None,
+    rate_limits: Optional[Dict[str, Tuple[int, float]]] = None,
+    stream: Optional[TextIO] = None,
+):
+    """
+    Configure logging for the project.
+
+    The arguments default to the ``LOG_*`` settings. With ``use_queue``, the
+    loggers only put the records on a queue and the handlers run on a
+    ``QueueListener`` thread, so writing the logs does not block the event loop.
+    """
+    log_format = log_format or settings.LOG_FORMAT
+    use_queue = settings.LOG_QUEUE if use_queue is None else use_queue
+    rate_limits = settings.LOG_RATE_LIMITS if rate_limits is None else rate_limits
+
+    stop_log_listener()
+    console = {
+        "class": "logging.StreamHandler",
+        "formatter": log_format,
+        "filters": ["rate_limit"],
+    }
+    if stream is not None:
+        console["stream"] = stream
     logging_dict = {
         "version": 1,
         "disable_existing_loggers": False,
         "formatters": {
-            "verbose": {
+            "text": {
                 "format": "[%(asctime)s: %(levelname)s] [%(pathname)s:%(lineno)d] %(message)s",
             },
+            "json": {
+                "()": JsonFormatter,
+            },
         },
-        "handlers": {
-            "console": {
-                "class": "logging.StreamHandler",
-                "formatter": "verbose",
+        "filters": {
+            "rate_limit": {
+                "()": RateLimitFilter,
+                "limits": rate_limits,
             },
         },
+        "handlers": {
+            "console": console,
+        },
         "root": {
             "handlers": ["console"],
-            "level": "INFO",
+            "level": settings.LOG_LEVEL,
         },
         "loggers": {
             "project": {
@@ -36,3 +179,47 @@ def configure_logging():
     }
 
     logging.config.dictConfig(logging_dict)
+    if use_queue:
+        start_log_listener([logging.getLogger(), logging.getLogger("project")])
+
+
+def start_log_listener(loggers: List[logging.Logger]):
+    """Move the handlers of ``loggers`` behind a queue drained by a listener thread."""
+    global _queue_handler, _listener  # pylint: disable=global-statement
+
+    handlers = list(loggers[0].handlers)
+    _queue_handler = LogQueueHandler(queue.SimpleQueue())
+    for handler in handlers:
+        # filter the records before they are queued
+        for log_filter in list(handler.filters):
+            _queue_handler.addFilter(log_filter)
+            handler.removeFilter(log_filter)
+    for logger in loggers:
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(_queue_handler)
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_log_listener():
+    """Write the queued records and stop the listener thread."""
+    global _listener  # pylint: disable=global-statement
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_log_listener():
+    """Start a listener in a forked process, the listener thread of the parent is not copied."""
+    global _listener  # pylint: disable=global-statement
+
+    if _listener is not None:
+        _queue_handler.queue = queue.SimpleQueue()
+        _listener = QueueListener(_queue_handler.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+atexit.register(stop_log_listener)
+os.register_at_fork(after_in_child=_restart_log_listener)
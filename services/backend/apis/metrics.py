@@ -0,0 +1,276 @@
+"""Prometheus metrics of the API, the Celery workers and the database pools."""
+
+import os
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+)
+
+from apis.celery_utils import (
+    enqueue_stats,
+    get_redis_client,
+)
+from apis.config import settings
+from apis.utils import chunked
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_init,
+    worker_process_shutdown,
+)
+from kombu.transport.redis import PRIORITY_STEPS
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import (
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    Metric,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+if TYPE_CHECKING:
+    # the workers import this module, they do not need broadcaster
+    from apis.broadcast import TaskStatusHub
+
+# set before the processes start to aggregate the metrics of all of them
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests.",
+    ["method", "route", "status"],
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "Open task status WebSocket connections.",
+    multiprocess_mode="livesum",
+)
+SOCKETIO_CONNECTIONS = Gauge(
+    "socketio_connections",
+    "Open task status Socket.IO connections.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts",
+    "Connections checked out of the database pools.",
+    ["engine"],
+)
+CELERY_TASK_RUNTIME = Histogram(
+    "celery_task_runtime_seconds",
+    "Time spent running Celery tasks.",
+    ["task", "state"],
+)
+CELERY_TASK_WAIT = Histogram(
+    "celery_task_wait_seconds",
+    "Time between publishing a Celery task and a worker starting it.",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float("inf")),
+)
+USER_CACHE_LOOKUPS = Counter(
+    "user_cache_lookups",
+    "User cache lookups, by the tier which answered them.",
+    ["tier"],
+)
+CELERY_TASK_RETRIES = Counter(
+    "celery_task_retries",
+    "Retries requested by Celery tasks.",
+    ["task"],
+)
+CELERY_TASK_DEFERRALS = Counter(
+    "celery_task_deferrals",
+    "Celery tasks published again while the circuit of their downstream service is open.",
+    ["task"],
+)
+
+# ---------------------
+# API
+# ---------------------
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of HTTP requests by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        """Time the request and label it once the router has matched it."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # the route template keeps the label cardinality bounded
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(scope["method"], getattr(route, "path", "unmatched"), status).observe(
+                time.perf_counter() - started
+            )
+
+
+def instrument_engine(engine: AsyncEngine, name: str):
+    """Count the connections checked out of the pool of an engine."""
+    counter = DB_POOL_CHECKOUTS.labels(name)
+    event.listen(engine.sync_engine.pool, "checkout", lambda *args: counter.inc())
+
+
+def pool_metrics(engines: Dict[str, AsyncEngine]) -> List[Metric]:
+    """Read the current usage of the API database pools."""
+    families = {
+        "checkedout": GaugeMetricFamily("db_pool_checked_out", "Connections in use.", labels=["engine"]),
+        "checkedin": GaugeMetricFamily("db_pool_checked_in", "Idle pooled connections.", labels=["engine"]),
+        "overflow": GaugeMetricFamily(
+            "db_pool_overflow", "Connections opened above the pool size.", labels=["engine"]
+        ),
+        "size": GaugeMetricFamily("db_pool_size", "Configured pool size.", labels=["engine"]),
+    }
+    for name, engine in engines.items():
+        pool = engine.sync_engine.pool
+        for stat, family in families.items():
+            # SQLite engines use pools without counters
+            if hasattr(pool, stat):
+                family.add_metric([name], getattr(pool, stat)())
+    return list(families.values())
+
+
+async def queue_depth_metrics(queues: Iterable[str]) -> List[Metric]:
+    """Read the number of messages waiting in each Celery queue of the Redis broker."""
+    family = GaugeMetricFamily("celery_queue_length", "Messages waiting in a Celery queue.", labels=["queue"])
+    queues = list(queues)
+    async with get_redis_client(settings.CELERY_BROKER_URL).pipeline(transaction=False) as pipe:
+        for queue in queues:
+            # kombu keeps one list per priority step
+            for priority in PRIORITY_STEPS:
+                pipe.llen(f"{queue}\x06\x16{priority}" if priority else queue)
+        lengths = await pipe.execute()
+    for queue, queue_lengths in zip(queues, chunked(lengths, len(PRIORITY_STEPS)), strict=True):
+        family.add_metric([queue], sum(queue_lengths))
+    return [family]
+
+
+def hub_metrics(hub: "TaskStatusHub") -> List[Metric]:
+    """Read the local watchers and broadcast subscriptions of the task status hub."""
+    watchers = GaugeMetricFamily("task_status_watchers", "Local watchers of task status channels.")
+    watchers.add_metric([], hub.watcher_count)
+    channels = GaugeMetricFamily("task_status_subscriptions", "Task status channels subscribed in the broadcaster.")
+    channels.add_metric([], hub.subscription_count)
+    return [watchers, channels]
+
+
+def enqueue_metrics() -> List[Metric]:
+    """Read the latency of the tasks published by this process."""
+    count = CounterMetricFamily("celery_enqueue", "Tasks published from async routes.")
+    count.add_metric([], enqueue_stats.count)
+    seconds = CounterMetricFamily("celery_enqueue_seconds", "Time spent publishing tasks from async routes.")
+    seconds.add_metric([], enqueue_stats.total_seconds)
+    slowest = GaugeMetricFamily("celery_enqueue_max_seconds", "Slowest task publish from async routes.")
+    slowest.add_metric([], enqueue_stats.max_seconds)
+    return [count, seconds, slowest]
+
+
+class _Families:
+    """Collector returning metric families read at scrape time."""
+
+    def __init__(self, families: List[Metric]):
+        self.families = families
+
+    def collect(self) -> List[Metric]:
+        """Return the families."""
+        return self.families
+
+
+def get_registry() -> CollectorRegistry:
+    """Get the registry of the metrics defined in this module."""
+    if MULTIPROCESS_DIR is None:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=MULTIPROCESS_DIR)
+    return registry
+
+
+def render_metrics(families: List[Metric]) -> bytes:
+    """Render the process metrics and the given families in the Prometheus text format."""
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(_Families(families))
+    return generate_latest(get_registry()) + generate_latest(registry)
+
+
+# ---------------------
+# Celery
+# ---------------------
+
+# start time of the tasks running in this process, by task id
+_task_started: Dict[str, float] = {}
+_task_started_lock = threading.Lock()
+
+
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):  # pylint: disable=unused-argument
+    """Add the publish time to the message headers, the worker reads it back from the request."""
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):  # pylint: disable=unused-argument
+    """Record the start of a task and how long it waited in the queue."""
+    with _task_started_lock:
+        _task_started[task_id] = time.perf_counter()
+    published_at = getattr(task.request, "published_at", None)
+    if published_at is not None:
+        CELERY_TASK_WAIT.labels(task.name).observe(max(time.time() - published_at, 0))
+
+
+@task_postrun.connect
+def record_task_runtime(task_id=None, task=None, state=None, **kwargs):  # pylint: disable=unused-argument
+    """Record the runtime of a task."""
+    with _task_started_lock:
+        started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_RUNTIME.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
+
+
+@task_retry.connect
+def record_task_retry(sender=None, reason=None, **kwargs):  # pylint: disable=unused-argument
+    """Count a retry of a task, or its deferral while a circuit is open."""
+    counter = CELERY_TASK_DEFERRALS if getattr(reason, "deferred", False) else CELERY_TASK_RETRIES
+    counter.labels(sender.name).inc()
+
+
+@worker_init.connect
+def start_worker_metrics_server(**kwargs):  # pylint: disable=unused-argument
+    """Serve the metrics of all the worker processes from the main worker process."""
+    if settings.WORKER_METRICS_PORT:
+        start_http_server(settings.WORKER_METRICS_PORT, registry=get_registry())
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):  # pylint: disable=unused-argument
+    """Drop the live gauges of a prefork child that exited."""
+    if MULTIPROCESS_DIR is not None:
+        multiprocess.mark_process_dead(pid or os.getpid(), path=MULTIPROCESS_DIR)
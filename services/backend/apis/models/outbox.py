@@ -0,0 +1,32 @@
+"""Celery outbox model."""
+
+from apis.database import Base
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    func,
+)
+
+
+class OutboxMessage(Base):
+    """Celery task waiting to be published by the outbox relay."""
+
+    __tablename__ = "celery_outbox"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    task_id = Column(String(36), unique=True, nullable=False)
+    task_name = Column(String(255), nullable=False)
+    args = Column(JSON, nullable=False)
+    kwargs = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __init__(self, task_id, task_name, args, kwargs):
+        """Initialize OutboxMessage model."""
+        self.task_id = task_id
+        self.task_name = task_name
+        self.args = args
+        self.kwargs = kwargs
@@ -1,11 +1,21 @@
 """User model."""
 
+from typing import (
+    Dict,
+    List,
+)
+
 from apis.database import Base
 from sqlalchemy import (
     Column,
     Integer,
     String,
 )
+from sqlalchemy.dialects import (
+    postgresql,
+    sqlite,
+)
+from sqlalchemy.sql.dml import Insert
 
 
 class User(Base):
@@ -21,3 +31,14 @@ class User(Base):
         """Initialize User model."""
         self.username = username
         self.email = email
+
+
+def insert_users_ignore_conflicts(dialect_name: str, rows: List[Dict[str, str]]) -> Insert:
+    """
+    Build a set-based ``INSERT ... ON CONFLICT DO NOTHING`` for users.
+
+    Rows clashing with the username or email unique constraints are skipped, and
+    the statement returns the id, username and email of the rows it inserted.
+    """
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    return insert(User).values(rows).on_conflict_do_nothing().returning(User.id, User.username, User.email)
@@ -0,0 +1,96 @@
+"""Transactional outbox for Celery tasks."""
+
+import asyncio
+import logging
+from typing import (
+    List,
+    Tuple,
+)
+
+from apis.celery_utils import create_celery
+from apis.config import settings
+from apis.database import AsyncSessionLocal
+from apis.logging import configure_logging
+from apis.models.outbox import OutboxMessage
+from celery import (
+    Celery,
+    Task,
+    uuid,
+)
+from sqlalchemy import (
+    delete,
+    select,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_in_outbox(session: AsyncSession, task: Task, *args, **kwargs) -> str:
+    """
+    Add a task to the outbox of the current transaction and return its id.
+
+    The task is only published by the relay once the transaction commits, so
+    it can neither be lost on a broker error nor refer to a rolled back row.
+    """
+    task_id = uuid()
+    session.add(OutboxMessage(task_id=task_id, task_name=task.name, args=list(args), kwargs=kwargs))
+    return task_id
+
+
+def publish_outbox_messages(celery_app: Celery, messages: List[Tuple[str, str, list, dict]]):
+    """Publish outbox messages back to back over a single broker connection."""
+    with celery_app.producer_or_acquire() as producer:
+        for task_id, task_name, args, kwargs in messages:
+            celery_app.send_task(task_name, args=args, kwargs=kwargs, task_id=task_id, producer=producer)
+
+
+async def relay_outbox_batch(session: AsyncSession, celery_app: Celery, batch_size: int) -> int:
+    """
+    Publish and delete one batch of outbox messages, returning its size.
+
+    Rows are locked with ``SKIP LOCKED`` so several relays can run side by side.
+    A crash between publishing and committing publishes the batch again, so
+    delivery is at least once with stable task ids.
+    """
+    async with session.begin():
+        result = await session.execute(
+            select(
+                OutboxMessage.id,
+                OutboxMessage.task_id,
+                OutboxMessage.task_name,
+                OutboxMessage.args,
+                OutboxMessage.kwargs,
+            )
+            .order_by(OutboxMessage.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        rows = result.all()
+        if not rows:
+            return 0
+        messages = [(row.task_id, row.task_name, row.args, row.kwargs) for row in rows]
+        # kombu publishes synchronously, keep the loop free for the database driver
+        await asyncio.to_thread(publish_outbox_messages, celery_app, messages)
+        await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_([row.id for row in rows])))
+    return len(rows)
+
+
+async def run_outbox_relay():
+    """Drain the outbox forever, sleeping only when it is empty."""
+    celery_app = create_celery()
+    logger.info("Outbox relay started")
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                relayed = await relay_outbox_batch(session, celery_app, settings.OUTBOX_BATCH_SIZE)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Error in outbox relay: %s", str(e), exc_info=True)
+            relayed = 0
+        if relayed < settings.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(run_outbox_relay())
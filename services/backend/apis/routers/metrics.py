@@ -0,0 +1,48 @@
+"""Metrics router in the Prometheus text format."""
+
+import logging
+
+from apis.broadcast import task_status_hub
+from apis.config import settings
+from apis.database import (
+    engine,
+    read_engine,
+)
+from apis.metrics import (
+    enqueue_metrics,
+    hub_metrics,
+    instrument_engine,
+    pool_metrics,
+    queue_depth_metrics,
+    render_metrics,
+)
+from fastapi import (
+    APIRouter,
+    Response,
+)
+from prometheus_client import CONTENT_TYPE_LATEST
+
+logger = logging.getLogger(__name__)
+
+# engines of the API process, the workers instrument their own
+ENGINES = {"primary": engine}
+if read_engine is not engine:
+    ENGINES["replica"] = read_engine
+for _name, _engine in ENGINES.items():
+    instrument_engine(_engine, _name)
+
+metrics_router = APIRouter(
+    prefix="/metrics",
+)
+
+
+@metrics_router.get("")
+async def metrics():
+    """Metrics endpoint."""
+    families = pool_metrics(ENGINES) + hub_metrics(task_status_hub) + enqueue_metrics()
+    try:
+        families += await queue_depth_metrics(queue.name for queue in settings.CELERY_TASK_QUEUES)
+    except Exception:  # pylint: disable=broad-except
+        # the other metrics are still useful while the broker is down
+        logger.warning("Failed to read the Celery queue lengths", exc_info=True)
+    return Response(render_metrics(families), media_type=CONTENT_TYPE_LATEST)
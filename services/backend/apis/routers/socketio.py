@@ -1,8 +1,10 @@
 """SocketIO."""
 
 import socketio
-from apis.celery_utils import get_task_info
+from apis.celery_utils import get_task_info_async
 from apis.config import settings
+from apis.metrics import SOCKETIO_CONNECTIONS
+from apis.socketio_manager import create_client_manager
 from fastapi import FastAPI
 from socketio.asyncio_namespace import AsyncNamespace
 
@@ -13,43 +15,37 @@ from socketio.asyncio_namespace import AsyncNamespace
 class TaskStatusNameSpace(AsyncNamespace):
     """SocketIO namespace for task status updates."""
 
+    def on_connect(self, sid, environ, auth=None):  # pylint: disable=unused-argument
+        """Count the connection."""
+        SOCKETIO_CONNECTIONS.inc()
+
+    def on_disconnect(self, sid):  # pylint: disable=unused-argument
+        """Count the disconnection."""
+        SOCKETIO_CONNECTIONS.dec()
+
     async def on_join(self, sid, data):
         """Join the room."""
         self.enter_room(sid=sid, room=data["task_id"])
         # just in case the task already finish
-        await self.emit("status", get_task_info(data["task_id"]), room=data["task_id"])
+        await self.emit("status", await get_task_info_async(data["task_id"]), room=data["task_id"])
 
 
 def register_socketio_app(app: FastAPI):
     """Register the SocketIO app."""
-    mgr = socketio.AsyncRedisManager(settings.WS_MESSAGE_QUEUE)
+    mgr = create_client_manager(settings.WS_MESSAGE_QUEUE)
     # https://python-socketio.readthedocs.io/en/latest/server.html#uvicorn-daphne-and-other-asgi-servers
     # https://github.com/tiangolo/fastapi/issues/129#issuecomment-714636723
-    sio = socketio.AsyncServer(async_mode="asgi", client_manager=mgr, logger=True, engineio_logger=True)
+    sio = socketio.AsyncServer(
+        async_mode="asgi",
+        client_manager=mgr,
+        serializer=settings.SOCKETIO_SERIALIZER,
+        logger=settings.SOCKETIO_LOGGER,
+        engineio_logger=settings.ENGINEIO_LOGGER,
+        http_compression=settings.SOCKETIO_HTTP_COMPRESSION,
+        compression_threshold=settings.SOCKETIO_COMPRESSION_THRESHOLD,
+    )
     sio.register_namespace(TaskStatusNameSpace("/task_status"))
     asgi = socketio.ASGIApp(
         socketio_server=sio,
     )
     app.mount("/ws", asgi)
-
-
-def update_celery_task_status_socketio(task_id):
-    """
-    Update Celery task status via Socket.IO.
-
-    This function is called in the Celery worker to emit task status updates
-    to connected clients using Socket.IO.
-
-    For more information on emitting events from external processes, see:
-    https://python-socketio.readthedocs.io/en/latest/server.html#emitting-from-external-processes
-
-    Args:
-    ----
-    task_id : str
-        The ID of the Celery task to update.
-
-    """
-    # connect to the redis queue as an external process
-    external_sio = socketio.RedisManager(settings.WS_MESSAGE_QUEUE, write_only=True)
-    # emit an event
-    external_sio.emit("status", get_task_info(task_id), room=task_id, namespace="/task_status")
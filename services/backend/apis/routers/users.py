@@ -1,29 +1,78 @@
 """User router."""
 
+import asyncio
+import json
 import logging
 import random
 from string import ascii_lowercase
-from typing import Dict
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Union,
+)
 
-from apis.celery_utils import get_task_info
-from apis.database import get_db_session
-from apis.models.users import User
-from apis.schemas.users import UserBody
+from apis.broadcast import task_status_hub
+from apis.cache import (
+    UserRecord,
+    user_cache,
+)
+from apis.celery_utils import (
+    PROGRESS,
+    enqueue,
+    get_task_info_async,
+    get_tasks_info_async,
+)
+from apis.config import settings
+from apis.database import (
+    db_read_context,
+    get_db_session,
+)
+from apis.export import (
+    EXPORT_CONTENT_TYPES,
+    decode_cursor,
+    encode_cursor,
+    format_header,
+    format_next_cursor,
+    format_rows,
+    iter_user_batches,
+)
+from apis.models.users import (
+    User,
+    insert_users_ignore_conflicts,
+)
+from apis.outbox import enqueue_in_outbox
+from apis.schemas.tasks import TaskIdsBody
+from apis.schemas.users import (
+    UserBody,
+    UserExportFilters,
+)
+from apis.tasks.export import export_users as export_users_task
 from apis.tasks.users import (
     sample_task,
     task_add_subscribe,
     task_process_notification,
     task_send_welcome_email,
 )
+from apis.utils import achunked
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Query,
     Request,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import (
+    JSONResponse,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
+from pydantic import ValidationError
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
@@ -44,21 +93,55 @@ async def form_example_get(request: Request) -> templates.TemplateResponse:
 @users_router.post("/form/")
 async def form_example_post(user_body: UserBody) -> JSONResponse:
     """Post a user."""
-    task = sample_task.delay(user_body.email)
+    task = await enqueue(sample_task.s(user_body.email))
     return JSONResponse({"task_id": task.task_id})
 
 
+async def wait_task_status(task_id: str, state: str, wait: float) -> Dict[str, Any]:
+    """Return the first status of a task other than ``state``, or its status after ``wait`` seconds."""
+    async with task_status_hub.watch(task_id) as queue:
+        # read again once subscribed, the task may have moved on in between
+        response = await get_task_info_async(task_id)
+        if response["state"] != state:
+            return response
+        try:
+            return await asyncio.wait_for(next_transition(queue, state), wait)
+        except asyncio.TimeoutError:
+            return response
+
+
+async def next_transition(queue: asyncio.Queue, state: str) -> Dict[str, Any]:
+    """Return the first payload of the queue whose state is not ``state``, or a new progress report."""
+    while True:
+        payload = await queue.get()
+        if payload["state"] != state or payload["state"] == PROGRESS:
+            return payload
+
+
 @users_router.get("/task_status/")
-async def task_status(task_id: str) -> JSONResponse:
-    """Get the status of a task."""
-    response = get_task_info(task_id)
+async def task_status(
+    task_id: str,
+    wait: float = Query(0, ge=0, le=settings.TASK_STATUS_MAX_WAIT),
+    state: Optional[str] = None,
+) -> JSONResponse:
+    """Get the status of a task, waiting up to ``wait`` seconds for it to leave the last seen ``state``."""
+    response = await get_task_info_async(task_id)
+    if wait and response["state"] == state:
+        response = await wait_task_status(task_id, state, wait)
+    return JSONResponse(response)
+
+
+@users_router.post("/task_status/bulk/")
+async def task_status_bulk(body: TaskIdsBody) -> JSONResponse:
+    """Get the status of many tasks in one call."""
+    response = await get_tasks_info_async(body.task_ids)
     return JSONResponse(response)
 
 
 @users_router.post("/webhook_test_async/")
 async def webhook_test_async() -> str:
     """Test async task notification."""
-    task_process_notification.delay()
+    await enqueue(task_process_notification.s())
     return "pong"
 
 
@@ -77,25 +160,211 @@ def form_socketio_example(request: Request) -> templates.TemplateResponse:
 @users_router.post("/user_subscribe")
 async def user_subscribe(user_body: UserBody, session: AsyncSession = Depends(get_db_session)) -> Dict[str, str]:
     """Create a new user and add them to a subscription list."""
+    row = {"username": user_body.username, "email": user_body.email}
     try:
         async with session.begin():
-            result = await session.execute(select(User).filter_by(username=user_body.username))
-            user = result.scalars().first()
-            if not user:
-                user = User(
-                    username=user_body.username,
-                    email=user_body.email,
-                )
-                session.add(user)
-                await session.flush()  # Flush to get the new user.id
-
-        # Move this outside of the session context
-        task_add_subscribe.delay(user.id)
-        return {"message": "Sent task to Celery successfully"}
+            # one round trip when the user is new, a second one only on conflict
+            result = await session.execute(insert_users_ignore_conflicts(session.bind.dialect.name, [row]))
+            user_id = result.scalar()
+            created = user_id is not None
+            if user_id is None:
+                result = await session.execute(select(User.id).filter_by(username=user_body.username))
+                user_id = result.scalar()
+            if user_id is not None:
+                # published by the outbox relay once the user is committed
+                enqueue_in_outbox(session, task_add_subscribe, user_id)
+    except IntegrityError as e:
+        logger.warning("Conflict in user_subscribe: %s", str(e))
+        raise HTTPException(status_code=409, detail="User already exists")
     except Exception as e:
         logger.error("Error in user_subscribe: %s", str(e), exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    if created:
+        # replaces the misses cached for the new user, existing users are left unchanged
+        await user_cache.set(UserRecord(user_id, user_body.username, user_body.email))
+    if user_id is None:
+        # the username is free but the email belongs to another user
+        raise HTTPException(status_code=409, detail="Email is already used by another user")
+
+    return {"message": "Sent task to Celery successfully"}
+
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def read_bulk_users(request: Request) -> AsyncIterator[Union[UserBody, str]]:
+    """
+    Yield the users of a JSON array or NDJSON request body.
+
+    NDJSON bodies are parsed line by line as they are received. Rows failing
+    validation are yielded as their error message.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_CONTENT_TYPES:
+        pending = b""
+        async for data in request.stream():
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield validate_bulk_user(line)
+        if pending.strip():
+            yield validate_bulk_user(pending)
+        return
+
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be a JSON array of users")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=422, detail="Body must be a JSON array of users")
+    for row in rows:
+        yield validate_bulk_user(row)
+
+
+def validate_bulk_user(row: Any) -> Union[UserBody, str]:
+    """Validate a row of a bulk import, returning the error message on failure."""
+    try:
+        if isinstance(row, bytes):
+            return UserBody.model_validate_json(row)
+        return UserBody.model_validate(row)
+    except ValidationError as e:
+        return str(e)
+
+
+async def upsert_users_chunk(session: AsyncSession, user_bodies: List[UserBody]) -> List[Dict[str, Any]]:
+    """
+    Insert a chunk of users in one statement and resolve the rows that already existed.
+
+    The subscription task of each resolved user is written to the outbox in the
+    same transaction, and published by the relay once the chunk is committed.
+    """
+    rows = [{"username": body.username, "email": body.email} for body in user_bodies]
+    async with session.begin():
+        inserted = await session.execute(insert_users_ignore_conflicts(session.bind.dialect.name, rows))
+        created = {row.username: row.id for row in inserted}
+        conflicted = {row["username"] for row in rows} - created.keys()
+        existing = {}
+        if conflicted:
+            found = await session.execute(select(User.id, User.username).where(User.username.in_(conflicted)))
+            existing = {row.username: row.id for row in found}
+
+        results = []
+        for row in rows:
+            username = row["username"]
+            if username in created:
+                # a username repeated in the chunk is only created by its first row
+                results.append({**row, "id": created.pop(username), "status": "created"})
+                existing[username] = results[-1]["id"]
+            elif username in existing:
+                results.append({**row, "id": existing[username], "status": "existing"})
+            else:
+                # the email belongs to another user
+                results.append({**row, "id": None, "status": "conflict"})
+                continue
+            enqueue_in_outbox(session, task_add_subscribe, results[-1]["id"])
+    return results
+
+
+@users_router.post("/bulk_subscribe")
+async def bulk_subscribe(request: Request, session: AsyncSession = Depends(get_db_session)) -> Dict[str, Any]:
+    """
+    Create many users and add them to a subscription list.
+
+    The body is either a JSON array of users or an NDJSON stream
+    (``Content-Type: application/x-ndjson``) with one user per line.
+    """
+    results: List[Dict[str, Any]] = []
+    async for chunk in achunked(read_bulk_users(request), settings.USER_BULK_CHUNK_SIZE):
+        user_bodies = [row for row in chunk if isinstance(row, UserBody)]
+        chunk_results = iter(await upsert_users_chunk(session, user_bodies) if user_bodies else [])
+        created = []
+        for row in chunk:
+            if isinstance(row, UserBody):
+                result = next(chunk_results)
+                if result["status"] == "created":
+                    created.append(UserRecord(result["id"], result["username"], result["email"]))
+            else:
+                result = {"id": None, "status": "invalid", "error": row}
+            results.append(result)
+        await user_cache.set(*created)
+
+    counts = {status: 0 for status in ("created", "existing", "conflict", "invalid")}
+    for result in results:
+        counts[result["status"]] += 1
+    return {**counts, "results": results}
+
+
+async def stream_users_export(
+    export_format: str, filters: UserExportFilters, after: int, limit: Optional[int]
+) -> AsyncIterator[str]:
+    """Yield the chunks of an export, ending with the cursor to resume from if ``limit`` stopped it early."""
+    header = format_header(export_format)
+    if header:
+        yield header
+    remaining = limit
+    # one row past the limit tells whether the export is complete
+    fetch = None if limit is None else limit + 1
+    batches = iter_user_batches(db_read_context, filters, settings.USER_EXPORT_BATCH_SIZE, after, limit=fetch)
+    async for rows in batches:
+        if remaining is not None and len(rows) > remaining:
+            rows = rows[:remaining]
+            if rows:
+                yield format_rows(rows, export_format)
+                after = rows[-1].id
+            yield format_next_cursor(encode_cursor(after, filters), export_format)
+            return
+        yield format_rows(rows, export_format)
+        after = rows[-1].id
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+@users_router.get("/export/")
+async def export_users(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    username_prefix: Optional[str] = None,
+    email_domain: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+) -> StreamingResponse:
+    """
+    Stream the users matching the filters by increasing id, as NDJSON or CSV.
+
+    The rows are read in keyset-paginated batches and written as they are read.
+    When ``limit`` stops the export before its last row, it ends with a
+    ``{"next_cursor": ...}`` line (``#next_cursor=...`` in CSV), and passing
+    that ``cursor`` resumes the export with the same filters.
+    """
+    filters = UserExportFilters(username_prefix=username_prefix, email_domain=email_domain)
+    after = 0
+    if cursor:
+        try:
+            after, cursor_filters = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if filters != UserExportFilters() and filters != cursor_filters:
+            raise HTTPException(status_code=400, detail="The cursor was issued for other filters")
+        filters = cursor_filters
+
+    return StreamingResponse(
+        stream_users_export(export_format, filters, after, limit),
+        media_type=EXPORT_CONTENT_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="users.{export_format}"'},
+    )
+
+
+@users_router.post("/export/jobs/")
+async def export_users_job(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    username_prefix: Optional[str] = None,
+    email_domain: Optional[str] = None,
+) -> JSONResponse:
+    """Start an export job writing the users to one gzip file, too big to stream in one request."""
+    filters = UserExportFilters(username_prefix=username_prefix, email_domain=email_domain)
+    task = await enqueue(export_users_task.s(export_format, filters.model_dump(exclude_none=True)))
+    return JSONResponse({"task_id": task.task_id})
+
 
 def random_username() -> str:
     """Generate a random username."""
@@ -113,8 +382,10 @@ async def transaction_celery(session: AsyncSession = Depends(get_db_session)) ->
     )
     async with session.begin():
         session.add(user)
+        await session.flush()  # Flush to get the new user.id
+        # the welcome email is published by the outbox relay after the commit
+        enqueue_in_outbox(session, task_send_welcome_email, user.id)
 
-    await session.refresh(user)  # Refresh to get the new user.id
+    await user_cache.set(UserRecord.from_user(user))
     logger.info("user %s %s is persistent now", user.id, user.username)
-    task_send_welcome_email.delay(user.id)
     return {"message": "done"}
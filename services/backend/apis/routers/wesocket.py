@@ -1,9 +1,10 @@
 """Websocket router for task status updates."""
 
-import json
+import asyncio
 
-from apis.broadcast import broadcast
-from apis.celery_utils import get_task_info
+from apis.broadcast import task_status_hub
+from apis.celery_utils import get_task_info_async
+from apis.metrics import WEBSOCKET_CONNECTIONS
 from fastapi import (
     APIRouter,
     WebSocket,
@@ -16,6 +17,18 @@ ws_router = APIRouter()
 # -----------------------
 
 
+async def forward_status(websocket: WebSocket, queue: asyncio.Queue):
+    """Send the status payloads of the queue to the websocket."""
+    while True:
+        await websocket.send_json(await queue.get())
+
+
+async def wait_disconnect(websocket: WebSocket):
+    """Wait until the client closes the websocket."""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
 @ws_router.websocket("/ws/task_status/{task_id}")
 async def ws_task_status(websocket: WebSocket):
     """Websocket endpoint to get task status."""
@@ -23,19 +36,19 @@ async def ws_task_status(websocket: WebSocket):
 
     task_id = websocket.scope["path_params"]["task_id"]
 
-    async with broadcast.subscribe(channel=task_id) as subscriber:
-        # just in case the task already finish
-        data = get_task_info(task_id)
-        await websocket.send_json(data)
-
-        async for event in subscriber:
-            await websocket.send_json(json.loads(event.message))
-
-
-async def update_celery_task_status(task_id: str):
-    """Update the task status."""
-    await broadcast.connect()
-    await broadcast.publish(
-        channel=task_id, message=json.dumps(get_task_info(task_id))  # RedisProtocol.publish expect str
-    )
-    await broadcast.disconnect()
+    with WEBSOCKET_CONNECTIONS.track_inprogress():
+        async with task_status_hub.watch(task_id) as queue:
+            # just in case the task already finish
+            data = await get_task_info_async(task_id)
+            await websocket.send_json(data)
+
+            # stop watching as soon as the client leaves, not on the next update
+            tasks = {
+                asyncio.ensure_future(forward_status(websocket, queue)),
+                asyncio.ensure_future(wait_disconnect(websocket)),
+            }
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
@@ -0,0 +1,15 @@
+"""Task schemas."""
+
+from typing import List
+
+from apis.config import settings
+from pydantic import (
+    BaseModel,
+    Field,
+)
+
+
+class TaskIdsBody(BaseModel):
+    """TaskIdsBody schema."""
+
+    task_ids: List[str] = Field(min_length=1, max_length=settings.TASK_STATUS_BULK_MAX_IDS)
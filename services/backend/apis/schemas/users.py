@@ -1,5 +1,7 @@
 """User schema."""
 
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -8,3 +10,10 @@ class UserBody(BaseModel):
 
     username: str
     email: str
+
+
+class UserExportFilters(BaseModel):
+    """UserExportFilters schema."""
+
+    username_prefix: Optional[str] = None
+    email_domain: Optional[str] = None
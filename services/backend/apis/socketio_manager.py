@@ -0,0 +1,77 @@
+"""Socket.IO Redis managers exchanging msgpack messages instead of pickles."""
+
+import logging
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+)
+
+import msgpack
+import socketio
+from apis.config import settings
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+def pack_message(data: Dict[str, Any]) -> bytes:
+    """Pack a manager message."""
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpack_message(message: Any) -> Any:
+    """Unpack a msgpack manager message, or return other messages (pickle, JSON) as they are."""
+    if isinstance(message, bytes):
+        try:
+            data = msgpack.unpackb(message, raw=False)
+        except (ValueError, msgpack.UnpackException):
+            return message
+        if isinstance(data, dict) and "method" in data:
+            return data
+    return message
+
+
+class MsgPackRedisManager(socketio.RedisManager):
+    """Write-only manager of the workers, publishing msgpack messages."""
+
+    def _publish(self, data):
+        """Publish a message, reconnecting once on error."""
+        try:
+            return self.redis.publish(self.channel, pack_message(data))
+        except RedisError:
+            logger.warning("Cannot publish to redis, reconnecting")
+            self._redis_connect()
+            return self.redis.publish(self.channel, pack_message(data))
+
+
+class AsyncMsgPackRedisManager(socketio.AsyncRedisManager):
+    """Manager of the web processes, reading msgpack messages as well as the pickles of older emitters."""
+
+    async def _publish(self, data):
+        """Publish a message, reconnecting once on error."""
+        try:
+            return await self.redis.publish(self.channel, pack_message(data))
+        except RedisError:
+            logger.warning("Cannot publish to redis, reconnecting")
+            self._redis_connect()
+            return await self.redis.publish(self.channel, pack_message(data))
+
+    async def _listen(self) -> AsyncIterator[Any]:
+        """Yield the messages, already decoded when they are msgpack."""
+        async for message in super()._listen():
+            yield unpack_message(message)
+
+
+def create_emitter(url: str) -> socketio.RedisManager:
+    """Create the write-only manager emitting to the Socket.IO clients from outside the web processes."""
+    if settings.SOCKETIO_SERIALIZER == "msgpack":
+        return MsgPackRedisManager(url, write_only=True)
+    return socketio.RedisManager(url, write_only=True)
+
+
+def create_client_manager(url: str) -> socketio.AsyncRedisManager:
+    """Create the manager of the Socket.IO server."""
+    if settings.SOCKETIO_SERIALIZER == "msgpack":
+        return AsyncMsgPackRedisManager(url)
+    return socketio.AsyncRedisManager(url)
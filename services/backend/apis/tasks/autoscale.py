@@ -0,0 +1,148 @@
+"""Worker autoscaler driven by the depth and the wait time of the broker queues."""
+
+import json
+import logging
+import math
+import sys
+import time
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import redis
+from apis.config import settings
+from apis.utils import chunked
+from celery.worker.autoscale import Autoscaler
+from kombu.transport.redis import PRIORITY_STEPS
+
+logger = logging.getLogger(__name__)
+
+
+def priority_keys(queue: str) -> List[str]:
+    """Return the Redis lists kombu uses for the priority steps of a queue."""
+    return [f"{queue}\x06\x16{priority}" if priority else queue for priority in PRIORITY_STEPS]
+
+
+def queue_bounds(queues: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    """Return the (min, max) processes of each queue, (0, 0) for queues without bounds."""
+    return {queue: tuple(settings.AUTOSCALE_QUEUE_BOUNDS.get(queue, (0, 0))) for queue in queues}
+
+
+def desired_processes(
+    depths: Dict[str, int],
+    waits: Dict[str, float],
+    bounds: Dict[str, Tuple[int, int]],
+    tasks_per_process: int,
+    max_wait: float,
+) -> int:
+    """
+    Return the number of processes a worker consuming ``bounds`` should run.
+
+    Each queue asks for one process per ``tasks_per_process`` waiting messages,
+    or for its whole share once its oldest message waited more than ``max_wait``
+    seconds, within its (min, max) bounds. The minimum of a queue is reserved:
+    it is counted even when the queue is empty.
+    """
+    total = 0
+    for queue, (low, high) in bounds.items():
+        depth = depths.get(queue, 0)
+        wanted = math.ceil(depth / tasks_per_process)
+        if depth and waits.get(queue, 0.0) > max_wait:
+            wanted = high
+        total += min(max(wanted, low), high)
+    return total
+
+
+def sample_queues(client: redis.Redis, queues: List[str]) -> Tuple[Dict[str, int], Dict[str, float]]:
+    """Read the depth of the queues and how long their oldest message has been waiting."""
+    with client.pipeline(transaction=False) as pipe:
+        for queue in queues:
+            for key in priority_keys(queue):
+                pipe.llen(key)
+                # kombu pushes on the left and pops on the right
+                pipe.lindex(key, -1)
+        replies = pipe.execute()
+
+    now = time.time()
+    depths: Dict[str, int] = {}
+    waits: Dict[str, float] = {}
+    for queue, queue_replies in zip(queues, chunked(replies, len(PRIORITY_STEPS) * 2), strict=True):
+        depths[queue] = sum(queue_replies[::2])
+        published = [published_at(message) for message in queue_replies[1::2] if message]
+        published = [value for value in published if value is not None]
+        waits[queue] = max(now - min(published), 0.0) if published else 0.0
+    return depths, waits
+
+
+def published_at(message: bytes) -> Optional[float]:
+    """Return the publish time stamped in the headers of a raw kombu message."""
+    try:
+        return float(json.loads(message)["headers"]["published_at"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class QueueDepthAutoscaler(Autoscaler):
+    """
+    Celery autoscaler sizing the pool from the broker queues instead of the prefetched tasks.
+
+    Enabled with ``--autoscale`` and ``CELERY_WORKER_AUTOSCALER``. The queues
+    consumed by the worker are sampled from Redis at most once per keepalive
+    tick, as Celery also calls :meth:`maybe_scale` for every received message,
+    and the pool is grown or shrunk towards :func:`desired_processes`, within the ``--autoscale``
+    bounds. Run one worker per queue (``python -m apis.tasks.autoscale <queues>``
+    prints the bounds to pass) so ``high_priority`` keeps its reserved processes
+    whatever the backlog of the other queues.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+        # the target of the last sample, reused until the next keepalive tick
+        self._wanted: Optional[int] = None
+        self._sampled_at = 0.0
+
+    @property
+    def queues(self) -> List[str]:
+        """Return the queues consumed by the worker."""
+        if self.worker is not None:
+            return sorted(self.worker.app.amqp.queues.consume_from)
+        return [queue.name for queue in settings.CELERY_TASK_QUEUES]
+
+    def desired(self) -> int:
+        """Return the target number of processes, within the worker bounds, sampled once per keepalive."""
+        now = time.monotonic()
+        if self._wanted is None or now - self._sampled_at >= self.keepalive:
+            queues = self.queues
+            depths, waits = sample_queues(self.client, queues)
+            wanted = desired_processes(
+                depths, waits, queue_bounds(queues), settings.AUTOSCALE_TASKS_PER_PROCESS, settings.AUTOSCALE_MAX_WAIT
+            )
+            self._wanted, self._sampled_at = wanted, now
+        return min(max(self._wanted, self.min_concurrency), self.max_concurrency)
+
+    def _maybe_scale(self, req=None):
+        """Grow or shrink the pool towards the target."""
+        try:
+            wanted = self.desired()
+        except redis.RedisError:
+            logger.warning("Autoscaler could not sample the broker queues", exc_info=True)
+            return False
+        procs = self.processes
+        if wanted > procs:
+            self.scale_up(wanted - procs)
+            return True
+        if wanted < procs:
+            self.scale_down(procs - wanted)
+            return True
+        return False
+
+
+if __name__ == "__main__":
+    # print the --autoscale value of a worker consuming the given comma separated queues
+    bounds = queue_bounds(sys.argv[1].split(","))
+    print(f"{sum(high for _, high in bounds.values())},{sum(low for low, _ in bounds.values())}")
@@ -0,0 +1,194 @@
+"""Base task class and per-process resources for async Celery tasks."""
+
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Optional,
+)
+
+import aiohttp
+from apis.config import settings
+from apis.database import (
+    create_engine_pair,
+    dispose_engines,
+)
+from apis.metrics import instrument_engine
+from celery import Task
+from celery._state import _task_stack
+from celery.signals import (
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+)
+
+# the Celery request of the task currently running on the worker loop
+_current_request: ContextVar = ContextVar("current_request", default=None)
+
+
+class WorkerResources:
+    """
+    Event loop, database engines and HTTP session shared by async tasks.
+
+    One instance lives in each worker process. The event loop runs in a daemon
+    thread, so async tasks can be awaited from any pool (prefork, solo, threads)
+    and from eager mode inside an already running loop.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="async-task-loop", daemon=True)
+        self.thread.start()
+        self.engine, self.read_engine = create_engine_pair(
+            settings.WORKER_DATABASE_POOL_SIZE, settings.WORKER_DATABASE_MAX_OVERFLOW
+        )
+        instrument_engine(self.engine, "worker")
+        if self.read_engine is not self.engine:
+            instrument_engine(self.read_engine, "worker_replica")
+        self.session_factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.read_session_factory = async_sessionmaker(self.read_engine, class_=AsyncSession, expire_on_commit=False)
+        self.http_session = self.run(self._create_http_session())
+
+    async def _create_http_session(self) -> aiohttp.ClientSession:
+        """Create the HTTP session inside the worker loop."""
+        connector = aiohttp.TCPConnector(limit=settings.IO_TASK_CONCURRENCY, ttl_dns_cache=300)
+        return aiohttp.ClientSession(connector=connector)
+
+    def run(self, coro) -> Any:
+        """Run a coroutine on the worker loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _aclose(self):
+        """Close the HTTP session and the engine pools."""
+        await self.http_session.close()
+        await dispose_engines(self.engine, self.read_engine)
+
+    def close(self):
+        """Release the pooled resources and stop the loop."""
+        try:
+            self.run(self._aclose())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+            self.loop.close()
+
+
+_resources: Optional[WorkerResources] = None
+_resources_lock = threading.Lock()
+
+
+def get_worker_resources() -> WorkerResources:
+    """Return the resources of the current process, creating them if needed."""
+    global _resources  # pylint: disable=global-statement
+    with _resources_lock:
+        # threads do not survive a fork, so a child must not reuse the parent's loop
+        if _resources is None or _resources.pid != os.getpid():
+            _resources = WorkerResources()
+        return _resources
+
+
+@worker_process_init.connect
+def init_worker_resources(**kwargs):  # pylint: disable=unused-argument
+    """Create the async resources as soon as a worker process starts."""
+    get_worker_resources()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_worker_resources(**kwargs):  # pylint: disable=unused-argument
+    """Close the async resources when the worker process exits."""
+    global _resources  # pylint: disable=global-statement
+    with _resources_lock:
+        if _resources is not None and _resources.pid == os.getpid():
+            _resources.close()
+        _resources = None
+
+
+@asynccontextmanager
+async def worker_session(readonly: bool = False):
+    """Get a database session from the worker engine pool, or the read pool if ``readonly``."""
+    resources = get_worker_resources()
+    factory = resources.read_session_factory if readonly else resources.session_factory
+    async with factory() as session:
+        yield session
+
+
+async def worker_get(model, pk: Any):
+    """
+    Load a row by primary key for reading.
+
+    The row is read from the replica and, if it has not replicated yet (e.g. a
+    user committed right before the task was published), from the primary.
+    """
+    async with worker_session(readonly=True) as session:
+        instance = await session.get(model, pk)
+    resources = get_worker_resources()
+    if instance is None and resources.read_engine is not resources.engine:
+        async with worker_session() as session:
+            instance = await session.get(model, pk)
+    return instance
+
+
+async def worker_get_many(model, pks: Iterable[Any]) -> Dict[Any, Any]:
+    """Load rows by primary key for reading with one query, keyed by primary key, as ``worker_get``."""
+    pk_column = model.__mapper__.primary_key[0]
+    missing = list(dict.fromkeys(pks))
+    instances: Dict[Any, Any] = {}
+    resources = get_worker_resources()
+    for readonly in (True, False):
+        async with worker_session(readonly=readonly) as session:
+            rows = await session.scalars(select(model).where(pk_column.in_(missing)))
+            instances.update((getattr(row, pk_column.key), row) for row in rows)
+        missing = [pk for pk in missing if pk not in instances]
+        if not missing or resources.read_engine is resources.engine:
+            break
+    return instances
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Get the HTTP session shared by the tasks of this process."""
+    return get_worker_resources().http_session
+
+
+class AsyncTask(Task):
+    """
+    Celery task whose body is a coroutine function.
+
+    The coroutine runs on the per-process worker loop, so a task only pays for its
+    own I/O instead of creating an event loop, engine and HTTP session per call.
+    """
+
+    @property
+    def request(self):
+        """Return the request of the task, also when read from the worker loop."""
+        return _current_request.get() or self._get_request()
+
+    async def _run_in_context(self, request, args, kwargs):
+        """Run the task body with the caller's request bound to the coroutine."""
+        _current_request.set(request)
+        return await self.run(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        """Execute the coroutine on the worker loop and return its result."""
+        # the tracer has already pushed the request when the task is run by a worker or eagerly
+        direct_call = self.request_stack.top is None
+        _task_stack.push(self)
+        if direct_call:
+            self.push_request(args=args, kwargs=kwargs)
+        try:
+            return get_worker_resources().run(self._run_in_context(self._get_request(), args, kwargs))
+        finally:
+            if direct_call:
+                self.pop_request()
+            _task_stack.pop()
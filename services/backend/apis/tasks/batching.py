@@ -0,0 +1,83 @@
+"""Micro-batching of the work of concurrent async tasks."""
+
+import asyncio
+import functools
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+BatchHandler = Callable[[List[Any]], Awaitable[Sequence[Any]]]
+
+
+class Batcher:
+    """
+    Buffer items submitted by concurrent tasks and handle them in batches.
+
+    Tasks running on the worker loop ``await batcher.submit(item)``; the items
+    are handed to ``handler`` together once ``max_size`` are buffered or
+    ``max_wait`` seconds after the first one. The handler returns one result per
+    item, in order, and an exception instance fails only its own item, so each
+    task still gets its own result, retries and ``task_postrun`` status update.
+    """
+
+    def __init__(self, handler: BatchHandler, max_size: int, max_wait: float):
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, item: Any) -> Any:
+        """Add an item to the current batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # a forked worker process runs its own loop
+            self._loop, self._pending, self._timer = loop, [], None
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        """Hand the buffered items to the handler."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Run the handler and resolve the future of every item."""
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+        except Exception as exc:  # pylint: disable=broad-except
+            results = [exc] * len(batch)
+        for (_, future), result in zip(batch, results, strict=True):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def batched(max_size: int, max_wait: float) -> Callable[[BatchHandler], Batcher]:
+    """Turn a coroutine function handling a list of items into a :class:`Batcher`."""
+
+    def decorator(handler: BatchHandler) -> Batcher:
+        return functools.update_wrapper(Batcher(handler, max_size, max_wait), handler, updated=())
+
+    return decorator
@@ -0,0 +1,217 @@
+"""Users export jobs, run as a chord of chunk exports on the low_priority queue."""
+
+import asyncio
+import gzip
+import os
+import shutil
+import time
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from apis.celery_utils import get_result_backend_client
+from apis.config import settings
+from apis.export import (
+    format_header,
+    format_rows,
+    iter_user_batches,
+)
+from apis.models.users import User
+from apis.schemas.users import UserExportFilters
+from apis.tasks.base import (
+    AsyncTask,
+    get_worker_resources,
+    worker_session,
+)
+from apis.tasks.progress import areport_progress
+from celery import (
+    Task,
+    chord,
+    shared_task,
+)
+from celery.utils.log import get_task_logger
+from redis.exceptions import LockError
+from sqlalchemy import (
+    func,
+    select,
+)
+
+logger = get_task_logger(__name__)
+
+# counters of the finished chunks of a job, kept a day after its last chunk
+EXPORT_STATS_TTL = 24 * 3600
+# longest wait (seconds) for, and hold of, the progress report lock of a job
+EXPORT_REPORT_TIMEOUT = 10
+
+
+def job_dir(job_id: str) -> Path:
+    """Return the directory of the parts and artifact of a job."""
+    return Path(settings.EXPORT_DIR) / job_id
+
+
+def split_id_range(first: Optional[int], last: Optional[int], size: int) -> List[Tuple[int, int]]:
+    """Split the ids from ``first`` to ``last`` into (after, until) ranges of at most ``size`` ids."""
+    if first is None or last is None:
+        # one empty chunk, so an empty table still yields an artifact
+        return [(0, 0)]
+    return [(after, min(after + size, last)) for after in range(first - 1, last, size)]
+
+
+async def read_id_range() -> Tuple[Optional[int], Optional[int]]:
+    """Return the lowest and highest user ids."""
+    async with worker_session(readonly=True) as session:
+        first, last = (await session.execute(select(func.min(User.id), func.max(User.id)))).one()
+    return first, last
+
+
+async def count_finished_chunk(job_id: str, rows: int):
+    """Count a finished chunk of a job and its rows."""
+    key = f"export:{job_id}"
+    async with get_result_backend_client().pipeline(transaction=True) as pipe:
+        pipe.hincrby(key, "chunks", 1)
+        pipe.hincrby(key, "rows", rows)
+        pipe.expire(key, EXPORT_STATS_TTL)
+        await pipe.execute()
+
+
+async def report_job_progress(task: Task, job_id: str, chunks: int, started_at: float):
+    """
+    Report the chunks of a job finished so far, under the job id.
+
+    The chunks finish in several processes, so the reports are serialized by a
+    Redis lock and each one reads the latest counts: a report never shows fewer
+    chunks than the previous one.
+    """
+    client = get_result_backend_client()
+    key = f"export:{job_id}"
+    try:
+        async with client.lock(f"{key}:report", timeout=EXPORT_REPORT_TIMEOUT, blocking_timeout=EXPORT_REPORT_TIMEOUT):
+            finished, rows, published = (
+                int(value or 0) for value in await client.hmget(key, "chunks", "rows", "published")
+            )
+            if finished <= published:
+                return
+            meta = {
+                "chunks": finished,
+                "total_chunks": chunks,
+                "rows": rows,
+                "rows_per_second": rows_per_second(rows, started_at),
+            }
+            # 100% is left to the result of the join
+            if await areport_progress(task, 99 * finished / chunks, meta, task_id=job_id):
+                await client.hset(key, "published", finished)
+    except LockError:
+        logger.warning("Progress of export %s not reported, the report lock is busy", job_id)
+
+
+def rows_per_second(rows: int, started_at: float) -> float:
+    """Return the throughput of a job since it started."""
+    return round(rows / max(time.time() - started_at, 1e-6), 1)
+
+
+@shared_task(name="low_priority:export_users", bind=True)
+def export_users(self, export_format: str = "ndjson", filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Export the users matching ``filters`` to one gzip file.
+
+    The id range is split into chunks of ``USER_EXPORT_CHUNK_IDS`` ids, exported
+    in parallel by a chord whose callback joins the parts, or removes them if a
+    chunk failed. The task is replaced by the chord, so its id reports the
+    progress and then the result of the job.
+    """
+    started_at = time.time()
+    ranges = split_id_range(*get_worker_resources().run(read_id_range()), settings.USER_EXPORT_CHUNK_IDS)
+    job_id = self.request.id
+    job_dir(job_id).mkdir(parents=True, exist_ok=True)
+    parts = [
+        export_users_chunk.s(job_id, index, after, until, len(ranges), export_format, filters, started_at)
+        for index, (after, until) in enumerate(ranges)
+    ]
+    logger.info("Exporting users in %s chunks, job %s", len(ranges), job_id)
+    join = export_users_join.s(job_id, export_format, started_at).on_error(export_users_cleanup.si(job_id))
+    return self.replace(chord(parts, join))
+
+
+@shared_task(name="low_priority:export_users_chunk", bind=True, base=AsyncTask)
+async def export_users_chunk(
+    self,
+    job_id: str,
+    index: int,
+    after: int,
+    until: int,
+    chunks: int,
+    export_format: str,
+    filters: Optional[Dict[str, Any]],
+    started_at: float,
+) -> Dict[str, Any]:
+    """Export the users with an id above ``after``, up to ``until``, to a gzip part of the job."""
+    path = job_dir(job_id) / f"part-{index:05d}.{export_format}.gz"
+    # written under a temporary name, so a retried chunk never leaves a truncated part
+    partial_path = path.with_suffix(".partial")
+    loop = asyncio.get_running_loop()
+    rows = 0
+    session_factory = partial(worker_session, readonly=True)
+    # the compression and the writes run in a thread, the loop may be shared with other tasks
+    with await loop.run_in_executor(None, gzip.open, partial_path, "wt") as part:
+        batches = iter_user_batches(
+            session_factory,
+            UserExportFilters.model_validate(filters or {}),
+            settings.USER_EXPORT_BATCH_SIZE,
+            after,
+            until,
+        )
+        async for batch in batches:
+            await loop.run_in_executor(None, part.write, format_rows(batch, export_format))
+            rows += len(batch)
+    os.replace(partial_path, path)
+
+    await count_finished_chunk(job_id, rows)
+    await report_job_progress(self, job_id, chunks, started_at)
+    return {"index": index, "path": str(path), "rows": rows}
+
+
+@shared_task(name="low_priority:export_users_join")
+def export_users_join(
+    parts: List[Dict[str, Any]], job_id: str, export_format: str, started_at: float
+) -> Dict[str, Any]:
+    """Join the gzip parts of a job into its artifact, and return the size and throughput of the job."""
+    directory = job_dir(job_id)
+    path = directory / f"users.{export_format}.gz"
+    partial_path = path.with_suffix(".partial")
+    parts = sorted(parts, key=lambda part: part["index"])
+    # gzip members can be concatenated, so the parts are copied without being decompressed
+    with open(partial_path, "wb") as artifact:
+        header = format_header(export_format)
+        if header:
+            artifact.write(gzip.compress(header.encode()))
+        for part in parts:
+            with open(part["path"], "rb") as part_file:
+                shutil.copyfileobj(part_file, artifact)
+    os.replace(partial_path, path)
+    for part in parts:
+        os.remove(part["path"])
+
+    rows = sum(part["rows"] for part in parts)
+    result = {
+        "path": str(path),
+        "bytes": path.stat().st_size,
+        "chunks": len(parts),
+        "rows": rows,
+        "seconds": round(time.time() - started_at, 3),
+        "rows_per_second": rows_per_second(rows, started_at),
+    }
+    logger.info("Exported %s users at %s rows/s to %s", rows, result["rows_per_second"], path)
+    return result
+
+
+@shared_task(name="low_priority:export_users_cleanup")
+def export_users_cleanup(job_id: str):
+    """Remove the parts of a failed job."""
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    logger.warning("Export job %s failed, its parts were removed", job_id)
@@ -0,0 +1,114 @@
+"""Throttled progress reports of the running tasks."""
+
+import asyncio
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    Optional,
+)
+
+from apis.celery_utils import (
+    PROGRESS,
+    task_status_payload,
+)
+from apis.config import settings
+from apis.tasks.status import get_status_publisher
+from celery import Task
+from celery.signals import task_postrun
+
+
+class ProgressThrottle:
+    """Let through at most one progress report per ``interval`` seconds of each task."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_reports: Dict[str, float] = {}
+        self._pruned_at = 0.0
+
+    def allow(self, task_id: str, final: bool = False) -> bool:
+        """Return whether a report of the task may be sent now, and if so count it as sent."""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            last = self._last_reports.get(task_id)
+            if not final and last is not None and now - last < self.interval:
+                return False
+            self._last_reports[task_id] = now
+        return True
+
+    def _prune(self, now: float):
+        """Drop the reports older than the interval, which no longer throttle, e.g. those of the jobs reported on."""
+        if now - self._pruned_at < self.interval:
+            return
+        self._pruned_at = now
+        self._last_reports = {
+            task_id: last for task_id, last in self._last_reports.items() if now - last < self.interval
+        }
+
+    def forget(self, task_id: str):
+        """Drop the state of a finished task."""
+        with self._lock:
+            self._last_reports.pop(task_id, None)
+
+
+progress_throttle = ProgressThrottle(settings.TASK_PROGRESS_INTERVAL_MS / 1000)
+
+
+def progress_result(pct: float, meta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return the result stored with the PROGRESS state."""
+    return {"progress": round(min(max(pct, 0.0), 100.0), 1), "meta": meta or {}}
+
+
+def _throttled(task: Task, pct: float, task_id: Optional[str]) -> Optional[str]:
+    """Return the id of the reported task if its report is not throttled."""
+    task_id = task_id or task.request.id
+    if task_id is None or not progress_throttle.allow(task_id, final=pct >= 100):
+        return None
+    return task_id
+
+
+def report_progress(
+    task: Task, pct: float, meta: Optional[Dict[str, Any]] = None, task_id: Optional[str] = None
+) -> bool:
+    """
+    Report the progress of a running task, in percent, with optional details.
+
+    Reports closer than ``TASK_PROGRESS_INTERVAL_MS`` to the previous one of the
+    task are dropped, except 100%. The others are stored in the result backend
+    as the PROGRESS state, so status reads see them, and pushed to the WebSocket
+    and Socket.IO watchers. ``task_id`` reports on behalf of another task, e.g.
+    the job a chord part belongs to. Returns whether the report was sent.
+    """
+    task_id = _throttled(task, pct, task_id)
+    if task_id is None:
+        return False
+    result = progress_result(pct, meta)
+    request = task.request if task_id == task.request.id else None
+    task.backend.store_result(task_id, result, PROGRESS, request=request)
+    get_status_publisher().publish(task_id, task_status_payload(PROGRESS, result))
+    return True
+
+
+async def areport_progress(
+    task: Task, pct: float, meta: Optional[Dict[str, Any]] = None, task_id: Optional[str] = None
+) -> bool:
+    """Report the progress of an async task like :func:`report_progress`, without blocking the worker loop."""
+    task_id = _throttled(task, pct, task_id)
+    if task_id is None:
+        return False
+    result = progress_result(pct, meta)
+    # the request is read here, it is bound to the coroutine and not to the executor thread
+    request = task.request if task_id == task.request.id else None
+    store = task.backend.store_result
+    await asyncio.get_running_loop().run_in_executor(None, store, task_id, result, PROGRESS, None, request)
+    get_status_publisher().publish(task_id, task_status_payload(PROGRESS, result))
+    return True
+
+
+@task_postrun.connect
+def forget_progress(task_id, **kwargs):  # pylint: disable=unused-argument
+    """Drop the throttle state of a finished task."""
+    progress_throttle.forget(task_id)
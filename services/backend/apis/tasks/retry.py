@@ -0,0 +1,154 @@
+"""Retry policy and circuit breaker of the tasks calling external services."""
+
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import aiohttp
+from apis.celery_utils import get_redis_client
+from apis.config import settings
+from apis.tasks.base import AsyncTask
+from celery.exceptions import Retry
+from celery.utils.time import get_exponential_backoff_interval
+
+# errors counted as a failure of the downstream service, other errors are the task's own
+DOWNSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class CircuitOpenError(Exception):
+    """The circuit of a downstream host is open, calls are not attempted."""
+
+    def __init__(self, host: str, remaining: float):
+        super().__init__(f"Circuit of {host} is open for {remaining:.1f}s")
+        self.host = host
+        self.remaining = remaining
+
+
+class Deferral(Retry):
+    """Retry of a task published again while the circuit of its downstream host is open."""
+
+    # told apart from the retries by the metrics, without importing this module
+    deferred = True
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by all the workers, with its state in Redis, keyed by host.
+
+    ``failure_threshold`` downstream errors in a row (no more than
+    ``failure_window`` seconds apart) open the circuit for ``reset_timeout``
+    seconds. Then a single probe call is let through: its success closes the
+    circuit and its failure opens it again right away.
+    """
+
+    def __init__(self, failure_threshold: int, failure_window: float, reset_timeout: float, prefix: str = "circuit"):
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        self.prefix = prefix
+
+    def _keys(self, host: str):
+        """Return the failures, open, tripped and probe keys of a host."""
+        return tuple(f"{self.prefix}:{host}:{name}" for name in ("failures", "open", "tripped", "probe"))
+
+    @property
+    def client(self):
+        """Get the Redis client of the running loop."""
+        return get_redis_client(settings.CELERY_BROKER_URL)
+
+    async def retry_after(self, host: str) -> float:
+        """Return 0 if a call to ``host`` may be made, or the seconds to wait."""
+        _, open_key, tripped_key, probe_key = self._keys(host)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.pttl(open_key)
+            pipe.exists(tripped_key)
+            open_ttl, tripped = await pipe.execute()
+        if open_ttl > 0:
+            return open_ttl / 1000
+        # half open: only the caller taking the probe lock tries the host
+        if tripped and not await self.client.set(probe_key, 1, nx=True, px=int(self.reset_timeout * 1000)):
+            return self.reset_timeout
+        return 0.0
+
+    async def record_success(self, host: str):
+        """Close the circuit of a host."""
+        failures_key, _, tripped_key, probe_key = self._keys(host)
+        await self.client.delete(failures_key, tripped_key, probe_key)
+
+    async def record_failure(self, host: str):
+        """Count a failure of a host and open its circuit past the threshold."""
+        failures_key, open_key, tripped_key, probe_key = self._keys(host)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(failures_key)
+            pipe.pexpire(failures_key, int(self.failure_window * 1000))
+            pipe.exists(tripped_key)
+            failures, _, tripped = await pipe.execute()
+        if failures < self.failure_threshold and not tripped:
+            return
+        reset_ms = int(self.reset_timeout * 1000)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(open_key, 1, px=reset_ms)
+            # remembers the circuit was open until a probe succeeds
+            pipe.set(tripped_key, 1, px=reset_ms * 4)
+            pipe.delete(failures_key, probe_key)
+            await pipe.execute()
+
+    @asynccontextmanager
+    async def guard(self, url: str) -> AsyncIterator[None]:
+        """Call the host of ``url`` only if its circuit is closed, and record the outcome."""
+        host = urlsplit(url).netloc
+        remaining = await self.retry_after(host)
+        if remaining:
+            raise CircuitOpenError(host, remaining)
+        try:
+            yield
+        except DOWNSTREAM_ERRORS:
+            await self.record_failure(host)
+            raise
+        await self.record_success(host)
+
+
+circuit_breaker = CircuitBreaker(
+    settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    settings.CIRCUIT_BREAKER_FAILURE_WINDOW,
+    settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+)
+
+
+class ExternalCallTask(AsyncTask):
+    """
+    Async task calling an external service.
+
+    ``retry_with_backoff`` retries with an exponential backoff of factor
+    ``retry_backoff``, capped at ``retry_backoff_max`` and with full jitter, so
+    the workers do not retry in lockstep. ``defer`` postpones a task whose
+    circuit is open without making the call nor counting a retry.
+    """
+
+    retry_backoff = settings.RETRY_BACKOFF
+    retry_backoff_max = settings.RETRY_BACKOFF_MAX
+    retry_jitter = True
+
+    def backoff_countdown(self) -> int:
+        """Return the countdown of the next retry."""
+        return get_exponential_backoff_interval(
+            factor=int(self.retry_backoff),
+            retries=self.request.retries,
+            maximum=self.retry_backoff_max,
+            full_jitter=self.retry_jitter,
+        )
+
+    def retry_with_backoff(self, exc: Exception) -> Retry:
+        """Retry the task after the backoff countdown."""
+        return self.retry(exc=exc, countdown=self.backoff_countdown())
+
+    def defer(self, exc: CircuitOpenError) -> Deferral:
+        """Publish the task again once the circuit may be closed, keeping its retries count."""
+        # spread the deferred tasks instead of releasing them all when the circuit closes
+        countdown = exc.remaining + random.uniform(0, settings.CIRCUIT_BREAKER_RESET_TIMEOUT)
+        signature = self.signature_from_request(self.request, countdown=countdown, retries=self.request.retries)
+        if not self.request.is_eager:
+            signature.apply_async()
+        return Deferral(exc=exc, when=countdown, is_eager=self.request.is_eager, sig=signature)
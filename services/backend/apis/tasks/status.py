@@ -0,0 +1,101 @@
+"""Task status publisher for WebSocket and Socket.IO listeners."""
+
+import json
+import logging
+import os
+import queue
+import threading
+from typing import (
+    Any,
+    Dict,
+    Optional,
+)
+
+import redis
+from apis.config import settings
+from celery.signals import (
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class TaskStatusPublisher:
+    """
+    Publish task status updates from a background thread.
+
+    The publisher holds one Redis connection pool for the WebSocket channels
+    (read by ``broadcaster`` in the web process) and one write-only Socket.IO
+    manager, so completing a task only costs a queue put on the worker thread.
+    """
+
+    def __init__(self, url: str):
+        self.pid = os.getpid()
+        # socketio is only needed once a worker process publishes, not to start the worker or beat
+        from apis.socketio_manager import create_emitter  # pylint: disable=import-outside-toplevel
+
+        self.redis = redis.Redis.from_url(url)
+        self.sio = create_emitter(url)
+        self.queue: queue.Queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="task-status-publisher", daemon=True)
+        self.thread.start()
+
+    def publish(self, task_id: str, payload: Dict[str, Any]):
+        """Queue a status payload for the listeners of ``task_id``."""
+        self.queue.put((task_id, payload))
+
+    def _send(self, task_id: str, payload: Dict[str, Any]):
+        """Send a payload to both the WebSocket and Socket.IO channels."""
+        self.redis.publish(task_id, json.dumps(payload))  # broadcaster expects a str message
+        self.sio.emit("status", payload, room=task_id, namespace="/task_status")
+
+    def _run(self):
+        """Drain the queue until the publisher is closed."""
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            try:
+                self._send(*item)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to publish status of task %s", item[0])
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending updates and release the connections."""
+        self.queue.put(_STOP)
+        self.thread.join(timeout=timeout)
+        self.redis.close()
+
+
+_publisher: Optional[TaskStatusPublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_status_publisher() -> TaskStatusPublisher:
+    """Return the publisher of the current process, creating it if needed."""
+    global _publisher  # pylint: disable=global-statement
+    with _publisher_lock:
+        if _publisher is None or _publisher.pid != os.getpid():
+            _publisher = TaskStatusPublisher(settings.WS_MESSAGE_QUEUE)
+        return _publisher
+
+
+@worker_process_init.connect
+def init_status_publisher(**kwargs):  # pylint: disable=unused-argument
+    """Connect the publisher as soon as a worker process starts."""
+    get_status_publisher()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_status_publisher(**kwargs):  # pylint: disable=unused-argument
+    """Flush and close the publisher when the worker process exits."""
+    global _publisher  # pylint: disable=global-statement
+    with _publisher_lock:
+        if _publisher is not None and _publisher.pid == os.getpid():
+            _publisher.close()
+        _publisher = None
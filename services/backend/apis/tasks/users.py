@@ -1,23 +1,54 @@
 """Users related tasks."""
 
-import asyncio
 import random
+from typing import (
+    Any,
+    Iterable,
+    List,
+    Optional,
+)
 
 import aiohttp
-import requests
-from apis.database import AsyncSessionLocal
+from apis.cache import (
+    UserRecord,
+    user_cache,
+)
+from apis.celery_utils import task_status_payload
+from apis.config import settings
 from apis.models.users import User
-from apis.routers.socketio import update_celery_task_status_socketio
-from apis.routers.wesocket import update_celery_task_status
-from asgiref.sync import async_to_sync
-from celery import shared_task
+from apis.tasks.base import (
+    AsyncTask,
+    get_http_session,
+    worker_get_many,
+    worker_session,
+)
+from apis.tasks.batching import batched
+from apis.tasks.progress import areport_progress
+from apis.tasks.retry import (
+    CircuitOpenError,
+    ExternalCallTask,
+    circuit_breaker,
+)
+from apis.tasks.status import get_status_publisher
+from celery import (
+    shared_task,
+    states,
+)
 from celery.signals import task_postrun
 from celery.utils.log import get_task_logger
+from sqlalchemy import select
 
 logger = get_task_logger(__name__)
+# rate limited by LOG_RATE_LIMITS, the periodic task runs every few seconds
+heartbeat_logger = get_task_logger("apis.tasks.heartbeat")
 
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=6)
+SUBSCRIBE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+NOTIFICATION_URL = "https://httpbin.org/delay/5"
+SUBSCRIBE_URL = "https://httpbin.org/delay/5"
 
-def api_call(email: str):
+
+async def api_call(email: str):
     """Simulate an api call."""
     logger.info("Processing email: %s", email)
     # used for testing a failed api call
@@ -25,7 +56,8 @@ def api_call(email: str):
         raise ValueError("random processing error")
 
     # used for simulating a call to a third-party api
-    requests.post("https://httpbin.org/delay/5", timeout=6)
+    async with get_http_session().post("https://httpbin.org/delay/5", timeout=HTTP_TIMEOUT) as response:
+        await response.read()
 
 
 @shared_task
@@ -34,38 +66,51 @@ def divide(x: int, y: int) -> float:
     return x / y
 
 
-@shared_task()
-def sample_task(email):
+# ---------------------
+# I/O bound tasks, routed to the io queue and awaited on the worker loop
+# ---------------------
+
+
+@shared_task(name="io:sample_task", base=AsyncTask)
+async def sample_task(email):
     """Sample task to simulate an api call."""
-    api_call(email)
+    await api_call(email)
 
 
-@shared_task(bind=True)
-def task_process_notification(self):
+@shared_task(name="io:task_process_notification", bind=True, base=ExternalCallTask)
+async def task_process_notification(self):
     """Task to process notification."""
     try:
         if not random.choice([0, 1]):
             # mimic random error
             raise ValueError("random processing error")
 
-        # this would block the I/O
-        requests.post("https://httpbin.org/delay/5", timeout=6)
+        await areport_progress(self, 10, {"step": "notifying"})
+        # the worker loop keeps serving the other calls while this one waits
+        async with circuit_breaker.guard(NOTIFICATION_URL), get_http_session().post(
+            NOTIFICATION_URL, timeout=HTTP_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            await response.read()
+    except CircuitOpenError as e:
+        logger.warning("%s, the notification is deferred", e)
+        raise self.defer(e)
     except Exception as e:
-        logger.error("exception raised, it would be retry after 5 seconds")
-        raise self.retry(exc=e, countdown=5)
+        logger.error("exception raised, it would be retried with backoff")
+        raise self.retry_with_backoff(e)
 
 
 # ---------------------
 # WebSockets
 # ---------------------
 @task_postrun.connect
-def task_postrun_handler(task_id, **kwargs):  # pylint: disable=unused-argument
+def task_postrun_handler(task_id, state=None, retval=None, **kwargs):  # pylint: disable=unused-argument
     """Update the task status callback function."""
-    # update websocket
-    async_to_sync(update_celery_task_status)(task_id)
-
-    # update socketio
-    update_celery_task_status_socketio(task_id)  # new
+    if state == states.IGNORED:
+        # e.g. a task replaced by a workflow, which reports under the same id
+        return
+    # publish to websocket and socketio listeners from the publisher thread
+    get_status_publisher().publish(task_id, task_status_payload(state, retval))
 
 
 # ---------------------
@@ -74,7 +119,7 @@ def task_postrun_handler(task_id, **kwargs):  # pylint: disable=unused-argument
 @shared_task(name="task_schedule_work")
 def task_schedule_work():
     """Periodic task to run every X seconds."""
-    logger.info("task_schedule_work run")
+    heartbeat_logger.info("task_schedule_work run")
 
 
 # ---------------------
@@ -98,30 +143,50 @@ def dynamic_example_three():
     logger.info("Example Three")
 
 
-@shared_task()
-def task_send_welcome_email(user_pk: int) -> None:
-    """Send a welcome email to a user."""
+# ---------------------
+# Per-user tasks, batched on the worker loop
+# ---------------------
+
 
-    async def process_email():
-        """Process the email."""
-        async with AsyncSessionLocal() as session:
-            try:
-                user = await session.get(User, user_pk)
-                if user:
-                    print(f"Sending email to {user.email} {user.id}")
-                    # Add your email sending logic here
-                else:
-                    print(f"User with id {user_pk} not found")
-            except Exception as e:
-                raise ValueError(f"Error processing welcome email for user {user_pk}: {str(e)}")
-
-    # Create a new event loop and run the async function
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+async def worker_read_users(field: str, values: List[Any]) -> Iterable[User]:
+    """Load the users whose ``field`` is in ``values`` from the worker sessions, for the user cache."""
+    if field == "id":
+        # falls back on the primary for the users not replicated yet
+        return (await worker_get_many(User, values)).values()
+    async with worker_session(readonly=True) as session:
+        return list(await session.scalars(select(User).where(getattr(User, field).in_(values))))
+
+
+@batched(max_size=settings.USER_TASK_BATCH_SIZE, max_wait=settings.USER_TASK_BATCH_WAIT)
+async def load_users(user_pks: List[int]) -> List[Optional[UserRecord]]:
+    """Load the users of a batch from the user cache, the missing ones with one query."""
+    users = await user_cache.get_many("id", user_pks, worker_read_users)
+    return [users[user_pk] for user_pk in user_pks]
+
+
+@batched(max_size=settings.USER_TASK_BATCH_SIZE, max_wait=settings.USER_TASK_BATCH_WAIT)
+async def subscribe_emails(emails: List[str]) -> List[None]:
+    """Add the emails of a batch to the subscription list with one call."""
+    async with circuit_breaker.guard(SUBSCRIBE_URL), get_http_session().post(
+        SUBSCRIBE_URL, json={"emails": emails}, timeout=SUBSCRIBE_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        await response.text()  # Ensure the request is completed
+    return [None] * len(emails)
+
+
+@shared_task(base=AsyncTask)
+async def task_send_welcome_email(user_pk: int) -> None:
+    """Send a welcome email to a user."""
     try:
-        loop.run_until_complete(process_email())
-    finally:
-        loop.close()
+        user = await load_users.submit(user_pk)
+        if user:
+            print(f"Sending email to {user.email} {user.id}")
+            # Add your email sending logic here
+        else:
+            print(f"User with id {user_pk} not found")
+    except Exception as e:
+        raise ValueError(f"Error processing welcome email for user {user_pk}: {str(e)}")
 
 
 # ---------------------
@@ -129,30 +194,17 @@ def task_send_welcome_email(user_pk: int) -> None:
 # ---------------------
 
 
-@shared_task(bind=True, max_retries=3)
-def task_add_subscribe(self, user_pk: int) -> None:
+@shared_task(bind=True, base=ExternalCallTask, max_retries=3, retry_backoff=60)
+async def task_add_subscribe(self, user_pk: int) -> None:
     """Add a user to a subscription list."""
-
-    async def process_subscription():
-        async with AsyncSessionLocal() as session:
-            try:
-                user = await session.get(User, user_pk)
-                if user:
-                    async with aiohttp.ClientSession() as http_session:
-                        async with http_session.post(
-                            "https://httpbin.org/delay/5", data={"email": user.email}, timeout=10
-                        ) as response:
-                            await response.text()  # Ensure the request is completed
-                    print(f"Added user {user.email} to subscription list")
-                else:
-                    print(f"User with id {user_pk} not found")
-            except Exception as e:
-                raise self.retry(exc=e, countdown=60)
-
-    # Create a new event loop and run the async function
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
     try:
-        loop.run_until_complete(process_subscription())
-    finally:
-        loop.close()
+        user = await load_users.submit(user_pk)
+        if user:
+            await subscribe_emails.submit(user.email)
+            print(f"Added user {user.email} to subscription list")
+        else:
+            print(f"User with id {user_pk} not found")
+    except CircuitOpenError as e:
+        raise self.defer(e)
+    except Exception as e:
+        raise self.retry_with_backoff(e)
@@ -0,0 +1,29 @@
+"""Helpers shared by the routers and tasks."""
+
+from itertools import islice
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    List,
+)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most ``size`` items."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+async def achunked(items: AsyncIterable, size: int) -> AsyncIterator[List]:
+    """Split an async iterable into lists of at most ``size`` items."""
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
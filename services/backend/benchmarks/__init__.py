@@ -0,0 +1 @@
+"""In-process benchmarks of the API and the Celery helpers."""
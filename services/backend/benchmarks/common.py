@@ -0,0 +1,73 @@
+"""Stand-ins and reporting helpers shared by the benchmarks."""
+
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+
+
+def start_fake_redis() -> str:
+    """Start an in-process fakeredis server and return its URL."""
+    from fakeredis import TcpFakeServer  # pylint: disable=import-outside-toplevel
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def configure_environment(redis_url: str, database_url: str):
+    """Point the settings at the stand-ins, must run before ``apis`` is imported."""
+    os.environ["FASTAPI_CONFIG"] = "development"
+    os.environ["DATABASE_URL"] = database_url
+    for name in ("CELERY_BROKER_URL", "CELERY_RESULT_BACKEND", "WS_MESSAGE_QUEUE", "USER_CACHE_URL"):
+        os.environ[name] = redis_url
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int, concurrency: int) -> Dict[str, Any]:
+    """Return throughput and latency percentiles of a scenario."""
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+    }
+
+
+def git_revision() -> str:
+    """Return the commit the benchmark ran against, if known."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(path: str, suite: str, options: Dict[str, Any], results: Dict[str, Any]):
+    """Write the results of a suite as JSON."""
+    report = {
+        "suite": suite,
+        "commit": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "options": options,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2)
+        output.write("\n")
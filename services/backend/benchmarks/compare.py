@@ -0,0 +1,55 @@
+"""
+Compare two benchmark result files.
+
+Exits with status 1 when a scenario's p95 latency regressed by more than
+``--threshold`` percent::
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 15
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    """Load a result file."""
+    with open(path, encoding="utf-8") as results:
+        return json.load(results)
+
+
+def change(old: float, new: float) -> float:
+    """Return the relative change from ``old`` to ``new`` in percent."""
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main():
+    """Print the deltas of every scenario present in both files."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 regression in percent")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline {baseline['commit'][:10]}  candidate {candidate['commit'][:10]}")
+    regressions = []
+    for name, new in candidate["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        deltas = {key: change(old[key], new[key]) for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")}
+        print(
+            f"{name:20} rps {deltas['throughput_rps']:+7.1f}%  p50 {deltas['p50_ms']:+7.1f}%  "
+            f"p95 {deltas['p95_ms']:+7.1f}%  p99 {deltas['p99_ms']:+7.1f}%"
+        )
+        if deltas["p95_ms"] > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"p95 regressed by more than {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
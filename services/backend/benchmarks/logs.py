@@ -0,0 +1,127 @@
+"""
+Request latency benchmark of the logging modes.
+
+Serves a route logging like a busy Socket.IO request (one application record
+and ``--records`` Engine.IO packet records) through httpx's ASGI transport,
+with the logs written to a stream taking ``--sink-delay`` seconds per write,
+like a blocking pipe to a log collector::
+
+    python -m benchmarks.logs --requests 1000 --concurrency 20 --output bench-logs.json
+
+Each logging mode is measured in turn: text and JSON records written by the
+event loop, or queued to a listener thread, with or without the
+``LOG_RATE_LIMITS`` of the settings.
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+)
+
+from benchmarks.common import write_results
+from benchmarks.routers import run_load
+
+# (format, queued, rate limited) of each mode
+MODES = {
+    "text": ("text", False, False),
+    "json": ("json", False, False),
+    "json_rate_limited": ("json", False, True),
+    "json_queue": ("json", True, False),
+    "json_queue_rate_limited": ("json", True, True),
+}
+
+
+class SlowStream:
+    """Stream counting the written records, blocking ``delay`` seconds per write."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.records = 0
+        self._lock = threading.Lock()
+
+    def write(self, text: str):
+        """Write a record."""
+        time.sleep(self.delay)
+        with self._lock:
+            self.records += text.count("\n")
+
+    def flush(self):
+        """Nothing is buffered."""
+
+
+def create_bench_app(records: int):
+    """Create an app whose route logs ``records`` packet records per request."""
+    from fastapi import FastAPI  # pylint: disable=import-outside-toplevel
+
+    app = FastAPI()
+    logger = logging.getLogger("apis.bench")
+    packet_logger = logging.getLogger("engineio.server")
+
+    @app.get("/log")
+    async def log_route():
+        logger.info("request handled", extra={"route": "/log"})
+        for number in range(records):
+            packet_logger.info("%s: Sending packet MESSAGE data %s", "sid", number)
+        return {"ok": True}
+
+    return app
+
+
+async def run_mode(app, requests: int, concurrency: int) -> Dict[str, Any]:
+    """Send the requests to the logging route."""
+    import httpx  # pylint: disable=import-outside-toplevel
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def log_request(_):
+            return (await client.get("/log")).status_code == 200
+
+        return await run_load(log_request, requests, concurrency)
+
+
+def main():
+    """Run the benchmark and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="requests per logging mode")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent clients")
+    parser.add_argument("--records", type=int, default=5, help="packet records logged per request")
+    parser.add_argument("--sink-delay", type=float, default=0.0002, help="seconds blocked per written record")
+    parser.add_argument("--output", default="bench-logs.json", help="path of the JSON results")
+    args = parser.parse_args()
+
+    from apis.config import settings  # pylint: disable=import-outside-toplevel
+    from apis.logging import (  # pylint: disable=import-outside-toplevel
+        configure_logging,
+        stop_log_listener,
+    )
+
+    app = create_bench_app(args.records)
+    results = {}
+    for name, (log_format, use_queue, rate_limited) in MODES.items():
+        stream = SlowStream(args.sink_delay)
+        rate_limits = settings.LOG_RATE_LIMITS if rate_limited else {}
+        configure_logging(log_format=log_format, use_queue=use_queue, rate_limits=rate_limits, stream=stream)
+        results[name] = asyncio.run(run_mode(app, args.requests, args.concurrency))
+        drain_started = time.perf_counter()
+        stop_log_listener()
+        results[name]["records_written"] = stream.records
+        results[name]["drain_ms"] = round((time.perf_counter() - drain_started) * 1000, 3)
+    configure_logging()
+
+    options = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results(args.output, "logs", options, results)
+    for name, result in results.items():
+        print(
+            f"{name:24} {result['throughput_rps']:>10} rps  p50 {result['p50_ms']:>8} ms  "
+            f"p95 {result['p95_ms']:>8} ms  records {result['records_written']:>6}  drain {result['drain_ms']} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Size and latency benchmark of the result backend serializers.
+
+Stores and reads back task results through the Celery result backend with the
+default JSON serializer and with the compact one (msgpack, zlib above
+``RESULT_COMPRESSION_THRESHOLD``), against a fakeredis server or ``--redis-url``::
+
+    python -m benchmarks.results --results 2000 --output bench-results.json
+
+Tasks annotated with ``ignore_result`` store nothing, so they are not measured.
+"""
+
+import argparse
+import time
+import uuid
+from typing import (
+    Any,
+    Dict,
+)
+
+from benchmarks.common import (
+    configure_environment,
+    start_fake_redis,
+    summarize,
+    write_results,
+)
+
+# a result without payload, like sample_task, and a result with a list of rows
+PAYLOADS = {
+    "empty": None,
+    "rows": [{"id": i, "username": f"user-{i}", "email": f"user-{i}@example.com", "active": True} for i in range(50)],
+}
+
+
+def run_scenario(backend, client, task_name: str, result: Any, count: int) -> Dict[str, Any]:
+    """Store and read ``count`` results of a task, return the latencies and stored bytes."""
+    from celery.app.task import Context  # pylint: disable=import-outside-toplevel
+
+    request = Context(task=task_name)
+    task_ids = [str(uuid.uuid4()) for _ in range(count)]
+
+    store_latencies = []
+    started = time.perf_counter()
+    for task_id in task_ids:
+        store_started = time.perf_counter()
+        backend.store_result(task_id, result, "SUCCESS", request=request)
+        store_latencies.append(time.perf_counter() - store_started)
+    store_elapsed = time.perf_counter() - started
+
+    keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+    read_latencies = []
+    started = time.perf_counter()
+    for key in keys:
+        read_started = time.perf_counter()
+        backend.decode_result(client.get(key))
+        read_latencies.append(time.perf_counter() - read_started)
+    read_elapsed = time.perf_counter() - started
+
+    with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.strlen(key)
+        stored_bytes = sum(pipe.execute())
+    client.delete(*keys)
+    return {
+        "stored_bytes": stored_bytes,
+        "bytes_per_result": round(stored_bytes / count, 1),
+        "store": summarize(store_latencies, store_elapsed, 0, 1),
+        "read": summarize(read_latencies, read_elapsed, 0, 1),
+    }
+
+
+def main():
+    """Run the benchmark and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=1000, help="results stored per scenario")
+    parser.add_argument("--redis-url", help="Redis server to use instead of an in-process fakeredis")
+    parser.add_argument("--output", default="bench-results.json", help="path of the JSON results")
+    args = parser.parse_args()
+
+    redis_url = args.redis_url or start_fake_redis()
+    configure_environment(redis_url, "sqlite+aiosqlite://")
+
+    import redis  # pylint: disable=import-outside-toplevel
+    from apis.app import create_app  # pylint: disable=import-outside-toplevel
+    from apis.tasks.users import (  # pylint: disable=import-outside-toplevel
+        divide,
+        sample_task,
+    )
+
+    celery_app = create_app().celery_app
+    client = redis.Redis.from_url(redis_url)
+    # sample_task keeps the JSON serializer, divide is annotated with result_compact
+    serializers = {"json": sample_task.name, "compact": divide.name}
+    results = {}
+    for payload_name, payload in PAYLOADS.items():
+        for serializer, task_name in serializers.items():
+            results[f"{payload_name}_{serializer}"] = run_scenario(
+                celery_app.backend, client, task_name, payload, args.results
+            )
+    client.close()
+
+    options = {"results": args.results, "redis": "custom" if args.redis_url else "fakeredis"}
+    write_results(args.output, "results", options, results)
+    for name, result in results.items():
+        print(
+            f"{name:15} {result['bytes_per_result']:>8} B/result  "
+            f"store p95 {result['store']['p95_ms']:>7} ms  read p95 {result['read']['p95_ms']:>7} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Load and latency benchmark of the API routers.
+
+Drives ``create_app()`` in process through httpx's ASGI transport, with a
+fakeredis server as broker, result backend and broadcast queue, SQLite (or
+``--database-url``) as database and Celery in eager mode::
+
+    python -m benchmarks.routers --requests 1000 --concurrency 20 --output bench-routers.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+)
+
+from benchmarks.common import (
+    configure_environment,
+    start_fake_redis,
+    summarize,
+    write_results,
+)
+
+TASK_IDS = [f"bench-task-{i}" for i in range(100)]
+
+
+async def run_load(send: Callable[[int], Awaitable[bool]], requests: int, concurrency: int) -> Dict[str, Any]:
+    """Send ``requests`` calls with ``concurrency`` concurrent clients."""
+    latencies = []
+    errors = 0
+    numbers = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for number in numbers:
+            started = time.perf_counter()
+            try:
+                ok = await send(number)
+            except Exception:  # pylint: disable=broad-except
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors, concurrency)
+
+
+async def run_http_scenarios(app, requests: int, concurrency: int) -> Dict[str, Any]:
+    """Benchmark the HTTP routes."""
+    import httpx  # pylint: disable=import-outside-toplevel
+    from apis.database import (  # pylint: disable=import-outside-toplevel
+        Base,
+        dispose_engines,
+        engine,
+        read_engine,
+    )
+    from celery import current_app  # pylint: disable=import-outside-toplevel
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    for number, task_id in enumerate(TASK_IDS):
+        # half of the polled tasks are finished, the other half still running
+        current_app.backend.store_result(task_id, None, "SUCCESS" if number % 2 else "STARTED")
+
+    run_id = uuid.uuid4().hex[:8]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def ping(_):
+            return (await client.get("/ping")).status_code == 200
+
+        async def task_status(number):
+            response = await client.get("/users/task_status/", params={"task_id": TASK_IDS[number % len(TASK_IDS)]})
+            return response.status_code == 200
+
+        async def user_subscribe(number):
+            username = f"bench-{run_id}-{number}"
+            response = await client.post(
+                "/users/user_subscribe", json={"username": username, "email": f"{username}@example.com"}
+            )
+            return response.status_code == 200
+
+        async def transaction_celery(_):
+            return (await client.get("/users/transaction_celery/")).status_code == 200
+
+        scenarios = {
+            "ping": ping,
+            "task_status": task_status,
+            "user_subscribe": user_subscribe,
+            "transaction_celery": transaction_celery,
+        }
+        for name, send in scenarios.items():
+            results[name] = await run_load(send, requests, concurrency)
+
+    await dispose_engines(engine, read_engine)
+    return results
+
+
+def run_websocket_scenario(app, redis_url: str, requests: int) -> Dict[str, Any]:
+    """Benchmark connecting to the task status websocket and receiving one update."""
+    import redis  # pylint: disable=import-outside-toplevel
+    from fastapi.testclient import TestClient  # pylint: disable=import-outside-toplevel
+
+    publisher = redis.Redis.from_url(redis_url)
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    with TestClient(app) as client:
+        for number in range(requests):
+            task_id = f"bench-ws-{number}"
+            request_started = time.perf_counter()
+            with client.websocket_connect(f"/ws/task_status/{task_id}") as websocket:
+                websocket.receive_json()
+                publisher.publish(task_id, json.dumps({"state": "SUCCESS"}))
+                errors += websocket.receive_json() != {"state": "SUCCESS"}
+            latencies.append(time.perf_counter() - request_started)
+    publisher.close()
+    return summarize(latencies, time.perf_counter() - started, errors, 1)
+
+
+def main():
+    """Run the benchmark and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent clients per HTTP scenario")
+    parser.add_argument("--ws-requests", type=int, default=100, help="websocket connections to open")
+    parser.add_argument("--database-url", help="database to use instead of a temporary SQLite file")
+    parser.add_argument("--output", default="bench-routers.json", help="path of the JSON results")
+    args = parser.parse_args()
+
+    redis_url = start_fake_redis()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.sqlite3')}"
+        configure_environment(redis_url, database_url)
+
+        from apis.app import create_app  # pylint: disable=import-outside-toplevel
+
+        app = create_app()
+        app.celery_app.conf.task_always_eager = True
+
+        results = asyncio.run(run_http_scenarios(app, args.requests, args.concurrency))
+        results["ws_task_status"] = run_websocket_scenario(app, redis_url, args.ws_requests)
+
+    options = {key: value for key, value in vars(args).items() if key not in ("output", "database_url")}
+    options["database"] = "custom" if args.database_url else "sqlite"
+    write_results(args.output, "routers", options, results)
+    for name, result in results.items():
+        print(
+            f"{name:20} {result['throughput_rps']:>10} rps  p50 {result['p50_ms']:>8} ms  "
+            f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
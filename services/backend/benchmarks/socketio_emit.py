@@ -0,0 +1,166 @@
+"""
+Emit throughput and memory benchmark of the Socket.IO server.
+
+Connects ``--clients`` clients to the ``/task_status`` namespace of an
+in-process server, each in the room of its own task, and measures with each
+serializer (``default`` JSON and ``msgpack``)::
+
+    python -m benchmarks.socketio_emit --clients 10000 --output bench-socketio.json
+
+* the memory held by the server per connection (Socket.IO state, the
+  transport buffers are not included), from ``tracemalloc``;
+* the latency of emitting a status to one room, and to the whole namespace;
+* the throughput and message size of the workers' write-only emitter,
+  publishing to a fakeredis server or ``--redis-url``.
+
+The packets are handed to a counting stand-in of Engine.IO instead of sockets.
+"""
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from typing import (
+    Any,
+    Dict,
+)
+
+from benchmarks.common import (
+    configure_environment,
+    start_fake_redis,
+    summarize,
+    write_results,
+)
+
+SERIALIZERS = ("default", "msgpack")
+PAYLOAD = {"state": "PROGRESS", "progress": 42.5, "meta": {"rows": 4250, "total": 10000}}
+
+
+class PacketSink:
+    """Engine.IO stand-in counting the packets and bytes sent to the clients."""
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+
+    async def send(self, eio_sid: str, data: Any):  # pylint: disable=unused-argument
+        """Count a packet."""
+        self.packets += 1
+        self.bytes += len(data)
+
+
+async def connect_clients(sio, clients: int) -> float:
+    """Connect the clients to their task room, return the bytes allocated per connection."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for number in range(clients):
+        eio_sid = f"eio-{number}"
+        await sio._handle_eio_connect(eio_sid, {})  # pylint: disable=protected-access
+        await sio._handle_connect(eio_sid, "/task_status", None)  # pylint: disable=protected-access
+        sid = sio.manager.sid_from_eio_sid(eio_sid, "/task_status")
+        sio.manager.enter_room(sid, "/task_status", f"task-{number}")
+    gc.collect()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return allocated / clients
+
+
+async def run_server_scenarios(serializer: str, clients: int, emits: int, broadcasts: int) -> Dict[str, Any]:
+    """Connect the clients to a server using ``serializer`` and emit to them."""
+    import socketio  # pylint: disable=import-outside-toplevel
+    from apis.routers.socketio import TaskStatusNameSpace  # pylint: disable=import-outside-toplevel
+
+    sio = socketio.AsyncServer(async_mode="asgi", serializer=serializer)
+    sio.register_namespace(TaskStatusNameSpace("/task_status"))
+    sink = PacketSink()
+    sio.eio.send = sink.send
+    bytes_per_connection = await connect_clients(sio, clients)
+    sink.packets = sink.bytes = 0
+
+    latencies = []
+    started = time.perf_counter()
+    for number in range(emits):
+        emit_started = time.perf_counter()
+        await sio.emit("status", PAYLOAD, room=f"task-{number % clients}", namespace="/task_status")
+        latencies.append(time.perf_counter() - emit_started)
+    room = summarize(latencies, time.perf_counter() - started, emits - sink.packets, 1)
+    room["bytes_per_packet"] = round(sink.bytes / max(sink.packets, 1), 1)
+    room["bytes_per_connection"] = round(bytes_per_connection, 1)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(broadcasts):
+        emit_started = time.perf_counter()
+        await sio.emit("status", PAYLOAD, namespace="/task_status")
+        latencies.append(time.perf_counter() - emit_started)
+    broadcast = summarize(latencies, time.perf_counter() - started, 0, 1)
+    broadcast["packets_per_second"] = round(broadcasts * clients / (time.perf_counter() - started), 1)
+    return {"room_emit": room, "broadcast": broadcast}
+
+
+def run_emitter_scenario(serializer: str, redis_url: str, emits: int) -> Dict[str, Any]:
+    """Emit through the write-only manager of the workers and measure the published messages."""
+    import redis  # pylint: disable=import-outside-toplevel
+    import socketio  # pylint: disable=import-outside-toplevel
+    from apis.socketio_manager import MsgPackRedisManager  # pylint: disable=import-outside-toplevel
+
+    manager_class = MsgPackRedisManager if serializer == "msgpack" else socketio.RedisManager
+    emitter = manager_class(redis_url, write_only=True)
+    subscriber = redis.Redis.from_url(redis_url).pubsub(ignore_subscribe_messages=True)
+    subscriber.subscribe(emitter.channel)
+
+    latencies = []
+    started = time.perf_counter()
+    for number in range(emits):
+        emit_started = time.perf_counter()
+        emitter.emit("status", PAYLOAD, room=f"task-{number}", namespace="/task_status")
+        latencies.append(time.perf_counter() - emit_started)
+    result = summarize(latencies, time.perf_counter() - started, 0, 1)
+
+    # the first calls only read the subscription confirmation
+    message = None
+    for _ in range(10):
+        message = subscriber.get_message(timeout=1)
+        if message:
+            break
+    result["bytes_per_message"] = len(message["data"]) if message else None
+    subscriber.close()
+    return result
+
+
+def main():
+    """Run the benchmark and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10000, help="clients connected to the namespace")
+    parser.add_argument("--emits", type=int, default=10000, help="emits to a single room")
+    parser.add_argument("--broadcasts", type=int, default=10, help="emits to the whole namespace")
+    parser.add_argument("--redis-url", help="Redis server to use instead of an in-process fakeredis")
+    parser.add_argument("--output", default="bench-socketio.json", help="path of the JSON results")
+    args = parser.parse_args()
+
+    redis_url = args.redis_url or start_fake_redis()
+    configure_environment(redis_url, "sqlite+aiosqlite://")
+
+    results = {}
+    for serializer in SERIALIZERS:
+        server = asyncio.run(run_server_scenarios(serializer, args.clients, args.emits, args.broadcasts))
+        results[f"room_emit_{serializer}"] = server["room_emit"]
+        results[f"broadcast_{serializer}"] = server["broadcast"]
+        results[f"emitter_{serializer}"] = run_emitter_scenario(serializer, redis_url, args.emits)
+
+    options = {key: value for key, value in vars(args).items() if key not in ("output", "redis_url")}
+    options["redis"] = "custom" if args.redis_url else "fakeredis"
+    write_results(args.output, "socketio", options, results)
+    for serializer in SERIALIZERS:
+        print(f"{serializer:8} {results[f'room_emit_{serializer}']['bytes_per_connection']:>10} B/connection")
+    for name, result in results.items():
+        print(
+            f"{name:18} {result['throughput_rps']:>10} emits/s",
+            f" p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms",
+        )
+
+
+if __name__ == "__main__":
+    main()
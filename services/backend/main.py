@@ -1,4 +1,4 @@
-from apis import create_app
+from apis.app import create_app
 
 app = create_app()
 celery = app.celery_app  # pylint: disable=R0801
@@ -4,9 +4,17 @@ import asyncio
 import os
 
 import pytest
-from apis import create_app
+from apis.app import create_app
+from apis.cache import user_cache
+from apis.celery_utils import create_celery
 from apis.config import settings as _settings
-from apis.database import Base
+from apis.database import (
+    Base,
+    dispose_engines,
+    engine,
+    read_engine,
+)
+from apis.tasks.base import close_worker_resources
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import (
@@ -17,6 +25,10 @@ from sqlalchemy.ext.asyncio import (
 
 os.environ["FASTAPI_CONFIG"] = "testing"  # noqa
 
+# collecting the test modules touches the task proxies, which finalizes the Celery app,
+# so the configuration (e.g. the task annotations) must be loaded first
+create_celery()
+
 
 @pytest.fixture(name="settings")
 def fixture_settings():
@@ -25,10 +37,19 @@ def fixture_settings():
     return _settings
 
 
+@pytest.fixture(scope="session", autouse=True)
+def worker_resources():
+    """Close the async task resources created by eager tasks."""
+    yield
+    close_worker_resources()
+
+
 @pytest.fixture
 async def app():
     """Create a new async test app for a test."""
-    return create_app()
+    yield create_app()
+    # pooled connections are bound to the event loop of the test
+    await dispose_engines(engine, read_engine)
 
 
 @pytest.fixture
@@ -61,3 +82,8 @@ async def db_session() -> AsyncSession:
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
+
+    # the users of the test are gone, so must be their cached lookups
+    user_cache.clear_local()
+    async for key in user_cache.client.scan_iter(f"{user_cache.prefix}:*"):
+        await user_cache.client.delete(key)
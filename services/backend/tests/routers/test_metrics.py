@@ -0,0 +1,30 @@
+"""Test the metrics router."""
+
+import pytest
+import redis
+from apis.tasks.users import divide
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_metrics(async_client: AsyncClient, settings):
+    """Test the metrics cover the routes, the queues and the tasks."""
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    client.delete("low_priority", "low_priority\x06\x169")
+    client.rpush("low_priority", "a", "b")
+    client.rpush("low_priority\x06\x169", "c")
+    divide.apply(args=(6, 3))
+    await async_client.get("/ping")
+
+    response = await async_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/ping",status="200"}' in body
+    assert 'celery_queue_length{queue="low_priority"} 3.0' in body
+    assert 'celery_queue_length{queue="default"}' in body
+    assert 'celery_task_runtime_seconds_count{state="SUCCESS",task="apis.tasks.users.divide"}' in body
+    assert "task_status_watchers 0.0" in body
+    client.delete("low_priority", "low_priority\x06\x169")
+    client.close()
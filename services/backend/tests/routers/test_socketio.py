@@ -0,0 +1,25 @@
+"""Test the task status Socket.IO namespace."""
+
+import pytest
+from apis.routers.socketio import TaskStatusNameSpace
+from prometheus_client import REGISTRY
+
+
+def connections() -> float:
+    """Return the open Socket.IO connections counted so far."""
+    return REGISTRY.get_sample_value("socketio_connections") or 0
+
+
+@pytest.mark.asyncio
+async def test_connect_with_auth():
+    """Test the clients sending an auth payload are accepted and counted like the others."""
+    namespace = TaskStatusNameSpace("/task_status")
+    before = connections()
+
+    assert await namespace.trigger_event("connect", "sid", {}, {"token": "x"}) is None
+    assert await namespace.trigger_event("connect", "other", {}) is None
+    assert connections() == before + 2
+
+    await namespace.trigger_event("disconnect", "sid")
+    await namespace.trigger_event("disconnect", "other")
+    assert connections() == before
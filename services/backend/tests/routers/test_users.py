@@ -1,8 +1,20 @@
+import asyncio
+import json
+import uuid
 from unittest import mock
 
 import pytest
+from apis.broadcast import TaskStatusHub
+from apis.cache import (
+    UserRecord,
+    user_cache,
+)
+from apis.models.outbox import OutboxMessage
 from apis.models.users import User
 from apis.routers.users import users_router
+from apis.tasks.users import task_add_subscribe
+from broadcaster import Broadcast
+from celery import current_app
 from httpx import AsyncClient
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -28,9 +40,6 @@ async def test_user_subscribe_with_eager_mode(
     async_client: AsyncClient, db_session: AsyncSession, settings, monkeypatch
 ):
     """Test the user_subscribe endpoint with eager mode enabled."""
-    mock_task_add_subscribe = mock.Mock()
-    monkeypatch.setattr("apis.routers.users.task_add_subscribe.delay", mock_task_add_subscribe)
-
     monkeypatch.setattr(settings, "CELERY_TASK_ALWAYS_EAGER", True, raising=False)
 
     user_name = "michaelyin"
@@ -53,10 +62,179 @@ async def test_user_subscribe_with_eager_mode(
     assert user is not None
     assert user.email == user_email
 
-    # Check if the Celery task was called
-    mock_task_add_subscribe.assert_called_once_with(user.id)
+    # Check if the Celery task was written to the outbox
+    async with db_session.begin():
+        result = await db_session.execute(select(OutboxMessage))
+        messages = result.scalars().all()
+
+    assert [(message.task_name, message.args) for message in messages] == [(task_add_subscribe.name, [user.id])]
 
-    # Clean up: delete the user
+    # Clean up: delete the user and the outbox message
     async with db_session.begin():
         await db_session.delete(user)
+        await db_session.delete(messages[0])
         await db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_task_status_bulk(async_client: AsyncClient):
+    """Test the task_status_bulk endpoint resolves many ids at once."""
+    backend = current_app.backend
+    backend.store_result("bulk-success", 1, "SUCCESS")
+    backend.store_result("bulk-failure", ValueError("boom"), "FAILURE")
+
+    response = await async_client.post(
+        users_router.url_path_for("task_status_bulk"),
+        json={"task_ids": ["bulk-success", "bulk-failure", "bulk-unknown", "bulk-success"]},
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "bulk-success": {"state": "SUCCESS"},
+        "bulk-failure": {"state": "FAILURE", "error": "boom"},
+        "bulk-unknown": {"state": "PENDING"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_task_status_long_poll(async_client: AsyncClient, monkeypatch):
+    """Test the long poll answers at once on a new state, else on the next transition or the timeout."""
+    task_id = str(uuid.uuid4())
+    current_app.backend.store_result(task_id, None, "STARTED")
+    url = users_router.url_path_for("task_status")
+
+    response = await async_client.get(url, params={"task_id": task_id, "wait": 5, "state": "PENDING"})
+    assert response.json() == {"state": "STARTED"}
+
+    async with Broadcast("memory://") as memory_broadcast:
+        hub = TaskStatusHub(memory_broadcast)
+        monkeypatch.setattr("apis.routers.users.task_status_hub", hub)
+
+        response = await async_client.get(url, params={"task_id": task_id, "wait": 0.1, "state": "STARTED"})
+        assert response.json() == {"state": "STARTED"}
+        assert hub.watcher_count == 0
+
+        poll = asyncio.ensure_future(async_client.get(url, params={"task_id": task_id, "wait": 5, "state": "STARTED"}))
+        while not hub.watcher_count:
+            await asyncio.sleep(0.01)
+        await memory_broadcast.publish(channel=task_id, message=json.dumps({"state": "STARTED"}))
+        await memory_broadcast.publish(channel=task_id, message=json.dumps({"state": "SUCCESS"}))
+        assert (await asyncio.wait_for(poll, 5)).json() == {"state": "SUCCESS"}
+
+    current_app.backend.forget(task_id)
+
+
+@pytest.mark.asyncio
+async def test_bulk_subscribe(async_client: AsyncClient, db_session: AsyncSession):
+    """Test the bulk_subscribe endpoint upserts JSON and NDJSON bodies, and writes the subscriptions to the outbox."""
+    async with db_session.begin():
+        db_session.add(User(username="existing", email="existing@example.com"))
+
+    response = await async_client.post(
+        users_router.url_path_for("bulk_subscribe"),
+        json=[
+            {"username": "bulk1", "email": "bulk1@example.com"},
+            {"username": "existing", "email": "existing@example.com"},
+            {"username": "other", "email": "existing@example.com"},
+            {"username": "no-email"},
+        ],
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [row["status"] for row in body["results"]] == ["created", "existing", "conflict", "invalid"]
+    assert (body["created"], body["existing"], body["conflict"], body["invalid"]) == (1, 1, 1, 1)
+    async with db_session.begin():
+        result = await db_session.execute(
+            select(OutboxMessage.task_name, OutboxMessage.args).order_by(OutboxMessage.id)
+        )
+    assert result.all() == [
+        (task_add_subscribe.name, [body["results"][0]["id"]]),
+        (task_add_subscribe.name, [body["results"][1]["id"]]),
+    ]
+
+    response = await async_client.post(
+        users_router.url_path_for("bulk_subscribe"),
+        content=(
+            b'{"username": "bulk1", "email": "bulk1@example.com"}\n'
+            b'{"username": "bulk2", "email": "bulk2@example.com"}'
+        ),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert [row["status"] for row in response.json()["results"]] == ["existing", "created"]
+
+
+@pytest.mark.asyncio
+async def test_user_subscribe_conflicts(async_client: AsyncClient, db_session: AsyncSession):
+    """Test the user_subscribe endpoint reuses existing users and rejects taken emails."""
+    user = User(username="taken", email="taken@example.com")
+    async with db_session.begin():
+        db_session.add(user)
+
+    response = await async_client.post(
+        users_router.url_path_for("user_subscribe"),
+        json={"email": "taken@example.com", "username": "taken"},
+    )
+    assert response.status_code == 200
+
+    response = await async_client.post(
+        users_router.url_path_for("user_subscribe"),
+        json={"email": "taken@example.com", "username": "someone-else"},
+    )
+    assert response.status_code == 409
+
+    async with db_session.begin():
+        result = await db_session.execute(select(OutboxMessage.args))
+    assert result.scalars().all() == [[user.id]]
+
+
+@pytest.mark.asyncio
+async def test_user_subscribe_caches_new_users(  # pylint: disable=unused-argument
+    async_client: AsyncClient, db_session: AsyncSession
+):
+    """Test the user_subscribe endpoint writes without a cache lookup, then caches the new user."""
+    loader = mock.AsyncMock(return_value=[])
+    with mock.patch.object(user_cache, "get_many", wraps=user_cache.get_many) as get_many:
+        response = await async_client.post(
+            users_router.url_path_for("user_subscribe"),
+            json={"email": "cached@example.com", "username": "cached"},
+        )
+    assert response.status_code == 200
+    get_many.assert_not_called()
+
+    user_cache.clear_local()
+    record = await user_cache.get("username", "cached", loader)
+    assert record == UserRecord(record.id, "cached", "cached@example.com")
+    loader.assert_not_called()
+    await user_cache.invalidate(record)
+
+
+@pytest.mark.asyncio
+async def test_export_users(async_client: AsyncClient, db_session: AsyncSession, monkeypatch, settings):
+    """Test the export streams the users in keyset pages and resumes from its cursor."""
+    monkeypatch.setattr(settings, "USER_EXPORT_BATCH_SIZE", 2)
+    async with db_session.begin():
+        db_session.add_all(
+            User(username=f"export{number}", email=f"export{number}@example.com") for number in range(5)
+        )
+        db_session.add(User(username="other", email="other@example.org"))
+
+    url = users_router.url_path_for("export_users")
+    response = await async_client.get(url, params={"email_domain": "example.com", "limit": 3})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["username"] for line in lines[:3]] == ["export0", "export1", "export2"]
+    assert list(lines[3]) == ["next_cursor"]
+
+    response = await async_client.get(url, params={"format": "csv", "cursor": lines[3]["next_cursor"]})
+    assert response.status_code == 200
+    assert response.text.splitlines() == [
+        "id,username,email",
+        f"{lines[2]['id'] + 1},export3,export3@example.com",
+        f"{lines[2]['id'] + 2},export4,export4@example.com",
+    ]
+
+    response = await async_client.get(url, params={"cursor": lines[3]["next_cursor"], "username_prefix": "x"})
+    assert response.status_code == 400
+    response = await async_client.get(url, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
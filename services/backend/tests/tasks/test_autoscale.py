@@ -0,0 +1,69 @@
+"""Test the queue depth autoscaler."""
+
+import json
+import time
+from unittest import mock
+
+import pytest
+import redis
+from apis.tasks.autoscale import (
+    QueueDepthAutoscaler,
+    desired_processes,
+    priority_keys,
+    sample_queues,
+)
+
+BOUNDS = {"high_priority": (2, 8), "default": (1, 8), "low_priority": (0, 4)}
+
+
+def test_desired_processes():
+    """Test the target follows the backlog within the bounds and keeps the reserved minimum."""
+    assert desired_processes({}, {}, BOUNDS, tasks_per_process=4, max_wait=5) == 3
+    assert desired_processes({"default": 10}, {"default": 1}, BOUNDS, tasks_per_process=4, max_wait=5) == 5
+    assert desired_processes({"low_priority": 1000}, {}, BOUNDS, tasks_per_process=4, max_wait=5) == 7
+    # a queue waiting for too long gets its whole share
+    assert desired_processes({"default": 1}, {"default": 10}, BOUNDS, tasks_per_process=4, max_wait=5) == 10
+
+
+@pytest.fixture(name="broker")
+def fixture_broker(settings):
+    """Get a client of the broker with empty queues."""
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    keys = [key for queue in BOUNDS for key in priority_keys(queue)]
+    client.delete(*keys)
+    yield client
+    client.delete(*keys)
+    client.close()
+
+
+def test_autoscaler_scales_from_the_broker(broker):
+    """Test the autoscaler grows the pool from the queue backlog and shrinks it once drained."""
+    message = json.dumps({"headers": {"published_at": time.time()}, "body": ""})
+    broker.lpush("default", *[message] * 12)
+    pool = mock.Mock(num_processes=3)
+    autoscaler = QueueDepthAutoscaler(pool, max_concurrency=20, min_concurrency=3, keepalive=0.01)
+
+    with mock.patch.dict("apis.config.settings.AUTOSCALE_QUEUE_BOUNDS", BOUNDS, clear=True):
+        autoscaler.maybe_scale()
+        # 3 processes for the backlog of default and the 2 reserved for high_priority
+        pool.grow.assert_called_once_with(2)
+        pool.num_processes = 5
+
+        broker.delete("default")
+        time.sleep(0.02)
+        autoscaler.maybe_scale()
+        pool.shrink.assert_called_once_with(2)
+    assert pool.maintain_pool.call_count == 2
+
+
+def test_autoscaler_samples_once_per_keepalive(broker):  # pylint: disable=unused-argument
+    """Test the scaling checks of the received messages reuse the last sample of the broker."""
+    pool = mock.Mock(num_processes=3)
+    autoscaler = QueueDepthAutoscaler(pool, max_concurrency=20, min_concurrency=3, keepalive=30)
+
+    with mock.patch.dict("apis.config.settings.AUTOSCALE_QUEUE_BOUNDS", BOUNDS, clear=True), mock.patch(
+        "apis.tasks.autoscale.sample_queues", wraps=sample_queues
+    ) as sample:
+        for _ in range(10):
+            autoscaler.maybe_scale()
+    assert sample.call_count == 1
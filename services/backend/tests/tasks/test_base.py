@@ -0,0 +1,24 @@
+"""Test the async task base class."""
+
+import asyncio
+
+from apis.tasks.base import (
+    AsyncTask,
+    get_worker_resources,
+)
+from celery import shared_task
+
+
+@shared_task(bind=True, base=AsyncTask)
+async def loop_probe(self):
+    """Return the running loop and the id of the current request."""
+    return id(asyncio.get_running_loop()), self.request.id
+
+
+def test_async_task_reuses_worker_loop(app):  # pylint: disable=unused-argument
+    """Test async tasks share one loop per process and see their request."""
+    first_loop, first_id = loop_probe.apply(task_id="first").get()
+    second_loop, second_id = loop_probe.apply(task_id="second").get()
+
+    assert first_loop == second_loop == id(get_worker_resources().loop)
+    assert (first_id, second_id) == ("first", "second")
@@ -0,0 +1,40 @@
+"""Test the micro-batching of async task work."""
+
+import asyncio
+
+import pytest
+from apis.tasks.batching import batched
+
+
+@pytest.mark.asyncio
+async def test_batches_by_size_and_wait():
+    """Test items are handled in batches of at most max_size, the rest after max_wait."""
+    batches = []
+
+    @batched(max_size=4, max_wait=0.05)
+    async def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    results = await asyncio.gather(*(double.submit(item) for item in range(10)))
+
+    assert results == [item * 2 for item in range(10)]
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+@pytest.mark.asyncio
+async def test_failures_are_per_item():
+    """Test an exception result fails its item only and a handler error fails the whole batch."""
+
+    @batched(max_size=10, max_wait=0.01)
+    async def check(items):
+        if "crash" in items:
+            raise RuntimeError("handler failed")
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    good, bad = await asyncio.gather(check.submit("good"), check.submit("bad"), return_exceptions=True)
+    assert good == "good"
+    assert isinstance(bad, ValueError)
+
+    results = await asyncio.gather(check.submit("ok"), check.submit("crash"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,89 @@
+"""Test the users export jobs."""
+
+import asyncio
+import gzip
+import os
+import time
+import uuid
+from unittest import mock
+
+import pytest
+from apis.models.users import User
+from apis.tasks.export import (
+    count_finished_chunk,
+    export_users,
+    export_users_cleanup,
+    job_dir,
+    report_job_progress,
+    split_id_range,
+)
+from celery import current_app
+
+
+def test_split_id_range():
+    """Test the id range is split into (after, until] chunks."""
+    assert split_id_range(3, 9, 3) == [(2, 5), (5, 8), (8, 9)]
+    assert split_id_range(None, None, 3) == [(0, 0)]
+
+
+def test_export_tasks_are_routed_to_the_low_priority_queue(app):  # pylint: disable=unused-argument
+    """Test the export job and its chunks go to the low_priority queue."""
+    assert current_app.amqp.router.route({}, export_users.name)["queue"].name == "low_priority"
+
+
+@pytest.mark.asyncio
+async def test_export_users(app, db_session, settings, monkeypatch, tmp_path):  # pylint: disable=unused-argument
+    """Test the chunks are exported and joined into one gzip artifact."""
+    monkeypatch.setattr(settings, "USER_EXPORT_CHUNK_IDS", 2)
+    monkeypatch.setattr(settings, "USER_EXPORT_BATCH_SIZE", 1)
+    monkeypatch.setattr(settings, "EXPORT_DIR", str(tmp_path))
+    db_session.add_all(User(username=f"export{i}", email=f"export{i}@example.com") for i in range(5))
+    db_session.add(User(username="other", email="other@example.org"))
+    await db_session.commit()
+
+    task = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: export_users.apply(args=("csv", {"email_domain": "example.com"}))
+    )
+    result = task.get()
+
+    assert (result["chunks"], result["rows"]) == (3, 5)
+    assert result["rows_per_second"] > 0
+    with gzip.open(result["path"], "rt") as artifact:
+        lines = artifact.read().splitlines()
+    assert lines[0] == "id,username,email"
+    assert [line.split(",")[1] for line in lines[1:]] == [f"export{i}" for i in range(5)]
+    assert os.listdir(tmp_path / task.id) == ["users.csv.gz"]
+
+
+@pytest.mark.asyncio
+async def test_failed_export_cleanup(  # pylint: disable=unused-argument
+    app, db_session, settings, monkeypatch, tmp_path
+):
+    """Test the chord of a job removes its directory when a chunk fails."""
+    monkeypatch.setattr(settings, "EXPORT_DIR", str(tmp_path))
+
+    with mock.patch.object(export_users, "replace") as replace:
+        task = await asyncio.get_running_loop().run_in_executor(None, lambda: export_users.apply(args=("csv",)))
+    (errback,) = replace.call_args.args[0].body.options["link_error"]
+
+    assert errback == export_users_cleanup.si(task.id)
+    assert job_dir(task.id).exists()
+    errback.apply()
+    assert not job_dir(task.id).exists()
+
+
+@pytest.mark.asyncio
+async def test_job_progress_never_goes_backwards(app):  # pylint: disable=unused-argument
+    """Test a chunk reporting after a later report of its job leaves the progress as it is."""
+    job_id, task = str(uuid.uuid4()), mock.Mock()
+    with mock.patch("apis.tasks.export.areport_progress", return_value=True) as report:
+        await count_finished_chunk(job_id, 10)
+        await count_finished_chunk(job_id, 10)
+        await report_job_progress(task, job_id, 4, time.time())
+        await report_job_progress(task, job_id, 4, time.time())
+
+    assert report.await_count == 1
+    assert report.await_args.args[1:3] == (
+        49.5,
+        {"chunks": 2, "total_chunks": 4, "rows": 20, "rows_per_second": mock.ANY},
+    )
@@ -0,0 +1,84 @@
+"""Test the progress reports of the tasks."""
+
+import uuid
+from unittest import mock
+
+import pytest
+from apis.celery_utils import (
+    get_task_info_async,
+    task_state_cache,
+)
+from apis.tasks.base import AsyncTask
+from apis.tasks.progress import (
+    ProgressThrottle,
+    areport_progress,
+    report_progress,
+)
+from celery import (
+    current_app,
+    shared_task,
+)
+
+
+@shared_task(bind=True)
+def progress_probe(self):
+    """Report progress three times in a row."""
+    return [report_progress(self, 10, {"rows": 1}), report_progress(self, 20), report_progress(self, 100)]
+
+
+@shared_task(bind=True, base=AsyncTask)
+async def async_progress_probe(self):
+    """Report progress from the worker loop."""
+    return await areport_progress(self, 42.5, {"rows": 425})
+
+
+def test_progress_throttle():
+    """Test reports closer than the interval are dropped, except the final one."""
+    throttle = ProgressThrottle(interval=60)
+
+    assert throttle.allow("task")
+    assert not throttle.allow("task")
+    assert throttle.allow("other")
+    assert throttle.allow("task", final=True)
+    throttle.forget("task")
+    assert throttle.allow("task")
+
+
+def test_progress_throttle_prunes_stale_reports():
+    """Test the reports older than the interval are dropped, so the throttle does not grow forever."""
+    throttle = ProgressThrottle(interval=60)
+    with mock.patch("apis.tasks.progress.time.monotonic", return_value=1000):
+        assert throttle.allow("job")
+    with mock.patch("apis.tasks.progress.time.monotonic", return_value=1061):
+        assert throttle.allow("task")
+
+    assert list(throttle._last_reports) == ["task"]  # pylint: disable=protected-access
+
+
+@pytest.mark.asyncio
+async def test_report_progress_stores_and_publishes(app):  # pylint: disable=unused-argument
+    """Test the reports let through are stored as PROGRESS and pushed to the watchers."""
+    task_id = str(uuid.uuid4())
+    publisher = mock.Mock()
+    with mock.patch("apis.tasks.progress.get_status_publisher", return_value=publisher):
+        assert progress_probe.apply(task_id=task_id).get() == [True, False, True]
+
+    assert publisher.publish.call_args_list == [
+        mock.call(task_id, {"state": "PROGRESS", "progress": 10, "meta": {"rows": 1}}),
+        mock.call(task_id, {"state": "PROGRESS", "progress": 100, "meta": {}}),
+    ]
+    task_state_cache.clear()
+    assert await get_task_info_async(task_id) == {"state": "PROGRESS", "progress": 100, "meta": {}}
+    current_app.backend.forget(task_id)
+
+
+@pytest.mark.asyncio
+async def test_async_report_progress(app):  # pylint: disable=unused-argument
+    """Test async tasks report their progress from the worker loop."""
+    task_id = str(uuid.uuid4())
+    with mock.patch("apis.tasks.progress.get_status_publisher"):
+        assert async_progress_probe.apply(task_id=task_id).get()
+
+    task_state_cache.clear()
+    assert await get_task_info_async(task_id) == {"state": "PROGRESS", "progress": 42.5, "meta": {"rows": 425}}
+    current_app.backend.forget(task_id)
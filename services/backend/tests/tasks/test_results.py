@@ -0,0 +1,67 @@
+"""Test the result policy of the tasks."""
+
+import uuid
+
+import pytest
+import redis
+from apis.celery_utils import (
+    get_task_info_async,
+    task_state_cache,
+)
+from apis.tasks.results import (
+    MSGPACK_MARKER,
+    MSGPACK_ZLIB_MARKER,
+)
+from apis.tasks.users import (
+    divide,
+    task_schedule_work,
+)
+from celery.app.task import Context
+
+
+@pytest.fixture(name="backend")
+def fixture_backend(app):
+    """Get the result backend and a raw client to inspect it."""
+    backend = app.celery_app.backend
+    client = redis.Redis.from_url(app.celery_app.conf.result_backend)
+    yield backend, client
+    client.close()
+    task_state_cache.clear()
+
+
+def test_ignored_results(app):  # pylint: disable=unused-argument
+    """Test the periodic task does not store its result."""
+    assert task_schedule_work.ignore_result
+
+
+@pytest.mark.asyncio
+async def test_compact_result(backend, settings):
+    """Test compact results are stored as msgpack with the task TTL and read back."""
+    backend, client = backend
+    small_id, large_id = str(uuid.uuid4()), str(uuid.uuid4())
+    backend.store_result(small_id, 2.0, "SUCCESS", request=Context(task=divide.name))
+    backend.store_result(
+        large_id, ["x" * 10] * settings.RESULT_COMPRESSION_THRESHOLD, "SUCCESS", request=Context(task=divide.name)
+    )
+
+    small = client.get(backend.get_key_for_task(small_id))
+    large = client.get(backend.get_key_for_task(large_id))
+    assert small.startswith(MSGPACK_MARKER)
+    assert large.startswith(MSGPACK_ZLIB_MARKER)
+    assert 0 < client.ttl(backend.get_key_for_task(small_id)) <= 3600
+    assert backend.decode_result(small)["result"] == 2.0
+    assert backend.decode_result(large)["result"] == ["x" * 10] * settings.RESULT_COMPRESSION_THRESHOLD
+    assert await get_task_info_async(small_id) == {"state": "SUCCESS"}
+
+
+def test_default_result(backend, settings):
+    """Test tasks without a policy keep JSON and the default TTL."""
+    backend, client = backend
+    task_id = str(uuid.uuid4())
+    backend.store_result(task_id, {"id": 1}, "SUCCESS", request=Context(task="apis.tasks.users.api_call"))
+
+    key = backend.get_key_for_task(task_id)
+    payload = client.get(key)
+    assert payload.startswith(b"{")
+    assert 3600 < client.ttl(key) <= settings.CELERY_RESULT_EXPIRES
+    assert backend.decode_result(payload)["result"] == {"id": 1}
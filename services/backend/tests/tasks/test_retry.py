@@ -0,0 +1,112 @@
+"""Test the retry policy and the circuit breaker of the external call tasks."""
+
+import asyncio
+import uuid
+from unittest import mock
+
+import aiohttp
+import pytest
+from apis.metrics import record_task_retry
+from apis.tasks.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Deferral,
+    ExternalCallTask,
+)
+from apis.tasks.users import task_add_subscribe
+from celery.exceptions import Retry
+from prometheus_client import REGISTRY
+
+
+@pytest.fixture(name="breaker")
+def fixture_breaker():
+    """Get a circuit breaker with its own keys."""
+    return CircuitBreaker(failure_threshold=2, failure_window=10, reset_timeout=0.2, prefix=f"test-{uuid.uuid4()}")
+
+
+async def fail(breaker, url="https://provider.test/notify"):
+    """Make a call failing with a downstream error."""
+    with pytest.raises(aiohttp.ClientError):
+        async with breaker.guard(url):
+            raise aiohttp.ClientError("down")
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_failures(breaker):
+    """Test the circuit opens at the threshold, per host, and rejects the calls meanwhile."""
+    await fail(breaker)
+    assert await breaker.retry_after("provider.test") == 0
+    await fail(breaker)
+
+    assert 0 < await breaker.retry_after("provider.test") <= 0.2
+    with pytest.raises(CircuitOpenError):
+        async with breaker.guard("https://provider.test/notify"):
+            pytest.fail("the call must not be made")
+    # other hosts are not affected
+    assert await breaker.retry_after("other.test") == 0
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe(breaker):
+    """Test a single probe is let through once the circuit resets, and its outcome decides."""
+    await fail(breaker)
+    await fail(breaker)
+    await asyncio.sleep(0.25)
+
+    assert await breaker.retry_after("provider.test") == 0
+    # the probe is in flight, the other callers wait
+    assert await breaker.retry_after("provider.test") > 0
+    # a failed probe opens the circuit again at once
+    await breaker.record_failure("provider.test")
+    assert await breaker.retry_after("provider.test") > 0.1
+
+    await asyncio.sleep(0.25)
+    async with breaker.guard("https://provider.test/notify"):
+        pass
+    assert await breaker.retry_after("provider.test") == 0
+
+
+def test_backoff_countdown(app):  # pylint: disable=unused-argument
+    """Test the countdown grows exponentially up to the maximum, with full jitter."""
+    task = task_add_subscribe._get_current_object()  # pylint: disable=protected-access
+    assert isinstance(task, ExternalCallTask)
+    for retries, ceiling in ((0, 60), (2, 240), (10, task.retry_backoff_max)):
+        task.push_request(retries=retries)
+        try:
+            countdowns = {task.backoff_countdown() for _ in range(50)}
+        finally:
+            task.pop_request()
+        assert all(0 <= countdown <= ceiling for countdown in countdowns)
+        assert len(countdowns) > 1
+
+
+def test_defer_keeps_the_retries(app, settings):  # pylint: disable=unused-argument
+    """Test a deferred task is published again after the open period without counting a retry."""
+    task = task_add_subscribe._get_current_object()  # pylint: disable=protected-access
+    task.push_request(id="deferred", args=(1,), kwargs={}, retries=1)
+    try:
+        with mock.patch("celery.canvas.Signature.apply_async") as apply_async:
+            retry = task.defer(CircuitOpenError("provider.test", 10))
+    finally:
+        task.pop_request()
+
+    assert isinstance(retry, Deferral)
+    apply_async.assert_called_once_with()
+    assert retry.sig.options["retries"] == 1
+    assert retry.sig.options["task_id"] == "deferred"
+    assert 10 <= retry.when <= 10 + settings.CIRCUIT_BREAKER_RESET_TIMEOUT
+
+
+def test_deferrals_are_not_counted_as_retries(app):  # pylint: disable=unused-argument
+    """Test the deferrals while a circuit is open have their own counter."""
+    labels = {"task": task_add_subscribe.name}
+
+    def count(name):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    retries, deferrals = count("celery_task_retries_total"), count("celery_task_deferrals_total")
+    record_task_retry(sender=task_add_subscribe, reason=Deferral(exc=CircuitOpenError("provider.test", 1)))
+    record_task_retry(sender=task_add_subscribe, reason=Retry(exc=ValueError()))
+
+    assert count("celery_task_retries_total") == retries + 1
+    assert count("celery_task_deferrals_total") == deferrals + 1
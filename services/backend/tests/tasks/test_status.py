@@ -0,0 +1,31 @@
+"""Test the task status publisher."""
+
+import json
+
+import redis
+from apis.celery_utils import task_status_payload
+from apis.tasks.status import TaskStatusPublisher
+
+
+def test_task_status_payload():
+    """Test the payload is built from the signal arguments."""
+    assert task_status_payload("SUCCESS", 42) == {"state": "SUCCESS"}
+    assert task_status_payload("FAILURE", ValueError("boom")) == {"state": "FAILURE", "error": "boom"}
+
+
+def test_publisher_sends_to_websocket_channel(settings):
+    """Test published payloads reach the task channel read by broadcaster."""
+    subscriber = redis.Redis.from_url(settings.WS_MESSAGE_QUEUE).pubsub(ignore_subscribe_messages=True)
+    subscriber.subscribe("publisher-task")
+    publisher = TaskStatusPublisher(settings.WS_MESSAGE_QUEUE)
+    try:
+        publisher.publish("publisher-task", {"state": "SUCCESS"})
+        for _ in range(10):
+            message = subscriber.get_message(timeout=1)
+            if message:
+                break
+    finally:
+        publisher.close()
+        subscriber.close()
+
+    assert json.loads(message["data"]) == {"state": "SUCCESS"}
@@ -0,0 +1,80 @@
+"""Test the users tasks."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from unittest import mock
+
+import pytest
+from apis.models.users import User
+from apis.tasks.base import get_worker_resources
+from apis.tasks.users import (
+    sample_task,
+    task_add_subscribe,
+    worker_read_users,
+)
+
+
+@asynccontextmanager
+async def slow_post(*args, **kwargs):  # pylint: disable=unused-argument
+    """Stand in for a slow third-party endpoint."""
+    await asyncio.sleep(0.5)
+    yield mock.AsyncMock()
+
+
+def test_io_tasks_are_routed_to_the_io_queue(app):
+    """Test the HTTP bound tasks go to the io queue."""
+    assert app.celery_app.amqp.router.route({}, sample_task.name)["queue"].name == "io"
+
+
+def test_io_tasks_share_the_worker_loop(app):  # pylint: disable=unused-argument
+    """Test the calls of concurrent io tasks are in flight together, as in the threads pool."""
+    session = mock.Mock(post=slow_post)
+    with mock.patch("apis.tasks.users.random.choice", return_value=0), mock.patch(
+        "apis.tasks.users.get_http_session", return_value=session
+    ), ThreadPoolExecutor(max_workers=20) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(lambda i: sample_task.apply(args=(f"user{i}@example.com",)), range(20)))
+        elapsed = time.perf_counter() - started
+
+    assert all(result.successful() for result in results)
+    # twenty 0.5s calls, but not one after the other
+    assert elapsed < 2
+
+
+@pytest.mark.asyncio
+async def test_subscribe_tasks_are_batched(app, db_session):  # pylint: disable=unused-argument
+    """Test concurrent subscribe tasks load their users and call the endpoint once per batch."""
+    users = [User(username=f"batch{i}", email=f"batch{i}@example.com") for i in range(5)]
+    db_session.add_all(users)
+    await db_session.commit()
+    calls = []
+
+    @asynccontextmanager
+    async def post(url, json, **kwargs):  # pylint: disable=unused-argument
+        calls.append(json["emails"])
+        yield mock.Mock(text=mock.AsyncMock())
+
+    with mock.patch("apis.tasks.users.get_http_session", return_value=mock.Mock(post=post)), ThreadPoolExecutor(
+        max_workers=5
+    ) as executor:
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(executor.map(lambda user: task_add_subscribe.apply(args=(user.id,)), users))
+        )
+
+    assert all(result.successful() for result in results)
+    assert [sorted(emails) for emails in calls] == [sorted(user.email for user in users)]
+
+
+@pytest.mark.asyncio
+async def test_worker_read_users_by_field(app, db_session):  # pylint: disable=unused-argument
+    """Test the worker loader of the user cache honours the looked up field."""
+    user = User(username="loader", email="loader@example.com")
+    db_session.add(user)
+    await db_session.commit()
+
+    by_id = get_worker_resources().run(worker_read_users("id", [user.id]))
+    by_email = get_worker_resources().run(worker_read_users("email", ["loader@example.com", "nobody@example.com"]))
+
+    assert [row.username for row in by_id] == [row.username for row in by_email] == ["loader"]
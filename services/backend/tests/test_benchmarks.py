@@ -0,0 +1,75 @@
+"""Smoke test of the benchmark suite."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+)
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def run_benchmark(tmp_path: Path, module: str, *args: str) -> Dict[str, Any]:
+    """Run a benchmark module against its own stand-ins and return its results."""
+    output = tmp_path / f"{module}.json"
+    # the benchmarks configure their own database and settings
+    env = {key: value for key, value in os.environ.items() if key not in ("FASTAPI_CONFIG", "DATABASE_URL")}
+    subprocess.run(
+        [sys.executable, "-m", f"benchmarks.{module}", *args, "--output", str(output)],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        timeout=120,
+    )
+    return json.loads(output.read_text())["results"]
+
+
+@pytest.mark.slow
+def test_routers_benchmark_runs(tmp_path):
+    """Test the router benchmark runs against its stand-ins without errors."""
+    results = run_benchmark(tmp_path, "routers", "--requests", "5", "--ws-requests", "2")
+
+    assert set(results) == {"ping", "task_status", "user_subscribe", "transaction_celery", "ws_task_status"}
+    assert all(result["errors"] == 0 for result in results.values())
+
+
+@pytest.mark.slow
+def test_results_benchmark_runs(tmp_path):
+    """Test the result backend benchmark shows the compact serializer is smaller."""
+    results = run_benchmark(tmp_path, "results", "--results", "5")
+
+    assert results["rows_compact"]["bytes_per_result"] < results["rows_json"]["bytes_per_result"]
+
+
+@pytest.mark.slow
+def test_importtime_benchmark_runs(tmp_path):
+    """Test the workers and the migrations start without loading the web stack."""
+    results = run_benchmark(tmp_path, "importtime", "--runs", "1")
+
+    assert set(results) == {"web", "worker", "migrations"}
+    assert results["worker"]["forbidden_modules"] == []
+    assert results["migrations"]["forbidden_modules"] == []
+
+
+@pytest.mark.slow
+def test_logs_benchmark_runs(tmp_path):
+    """Test the logging benchmark runs every mode and the rate limits drop records."""
+    results = run_benchmark(tmp_path, "logs", "--requests", "20", "--sink-delay", "0")
+
+    assert set(results) == {"text", "json", "json_rate_limited", "json_queue", "json_queue_rate_limited"}
+    assert results["json_queue_rate_limited"]["records_written"] < results["json_queue"]["records_written"]
+
+
+@pytest.mark.slow
+def test_socketio_benchmark_runs(tmp_path):
+    """Test the Socket.IO benchmark delivers every emit with both serializers."""
+    results = run_benchmark(tmp_path, "socketio_emit", "--clients", "50", "--emits", "50")
+
+    assert all(results[f"room_emit_{serializer}"]["errors"] == 0 for serializer in ("default", "msgpack"))
+    assert results["emitter_msgpack"]["bytes_per_message"] < results["emitter_default"]["bytes_per_message"]
@@ -0,0 +1,25 @@
+"""Test the task status hub."""
+
+import asyncio
+import json
+
+import pytest
+from apis.broadcast import TaskStatusHub
+from broadcaster import Broadcast
+
+
+@pytest.mark.asyncio
+async def test_task_status_hub_fans_out_and_cleans_up():
+    """Test one subscription feeds every watcher and is dropped with the last one."""
+    async with Broadcast("memory://") as memory_broadcast:
+        hub = TaskStatusHub(memory_broadcast)
+        async with hub.watch("hub-task") as first, hub.watch("hub-task") as second:
+            assert hub.watcher_count == 2
+            assert list(memory_broadcast._subscribers) == ["hub-task"]  # pylint: disable=protected-access
+
+            await memory_broadcast.publish(channel="hub-task", message=json.dumps({"state": "SUCCESS"}))
+            assert await asyncio.wait_for(first.get(), 1) == {"state": "SUCCESS"}
+            assert await asyncio.wait_for(second.get(), 1) == {"state": "SUCCESS"}
+
+        assert hub.watcher_count == 0
+        assert not memory_broadcast._subscribers  # pylint: disable=protected-access
@@ -0,0 +1,106 @@
+"""Tests for the user cache."""
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from apis.cache import (
+    UserCache,
+    UserRecord,
+)
+from prometheus_client import REGISTRY
+
+USERS = [SimpleNamespace(id=1, username="ann", email="ann@example.com")]
+
+
+def lookups(tier: str) -> float:
+    """Return the lookups answered by a tier so far."""
+    return REGISTRY.get_sample_value("user_cache_lookups_total", {"tier": tier}) or 0
+
+
+def make_cache() -> UserCache:
+    """Create a cache with its own keys."""
+    return UserCache(maxsize=2, local_ttl=60, ttl=60, negative_ttl=60, prefix=f"test-user-{uuid.uuid4().hex}")
+
+
+class CountingLoader:
+    """Loader of ``USERS`` counting its calls, each one taking a little while."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, field, values):
+        self.calls.append(values)
+        await asyncio.sleep(0.01)
+        return [user for user in USERS if getattr(user, field) in values]
+
+
+@pytest.mark.asyncio
+async def test_user_cache_tiers():
+    """Test the lookups are answered by the LRU, then Redis, then the loader."""
+    cache, loader = make_cache(), CountingLoader()
+    before = {tier: lookups(tier) for tier in ("local", "redis", "database")}
+
+    assert await cache.get("username", "ann", loader) == UserRecord(1, "ann", "ann@example.com")
+    assert await cache.get("username", "ann", loader) == UserRecord(1, "ann", "ann@example.com")
+    cache.clear_local()
+    assert await cache.get_many("username", ["ann"], loader) == {"ann": UserRecord(1, "ann", "ann@example.com")}
+
+    assert loader.calls == [["ann"]]
+    assert {tier: lookups(tier) - before[tier] for tier in before} == {"local": 1, "redis": 1, "database": 1}
+
+
+@pytest.mark.asyncio
+async def test_user_cache_misses_and_set():
+    """Test missing users are cached until the user is set, and invalidation drops every key."""
+    cache, loader = make_cache(), CountingLoader()
+    user = UserRecord(2, "bob", "bob@example.com")
+
+    assert await cache.get("email", "bob@example.com", loader) is None
+    assert await cache.get("email", "bob@example.com", loader) is None
+    assert len(loader.calls) == 1
+
+    await cache.set(user)
+    assert await cache.get("email", "bob@example.com", loader) == user
+    cache.clear_local()
+    assert await cache.get_many("id", [2], loader) == {2: user}
+
+    await cache.invalidate(user)
+    assert await cache.get("id", 2, loader) is None
+    assert len(loader.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_user_cache_single_flight():
+    """Test concurrent lookups of the same missing user share one load."""
+    cache, loader = make_cache(), CountingLoader()
+
+    results = await asyncio.gather(*(cache.get("id", 1, loader) for _ in range(10)))
+
+    assert results == [UserRecord(1, "ann", "ann@example.com")] * 10
+    assert loader.calls == [[1]]
+
+
+@pytest.mark.asyncio
+async def test_user_cache_lru_size():
+    """Test the least recently used entries are evicted from the LRU."""
+    cache, loader = make_cache(), CountingLoader()
+
+    await cache.get_many("id", [1, 2, 3], loader)
+
+    assert len(cache._entries) == cache.maxsize  # pylint: disable=protected-access
+
+
+@pytest.mark.asyncio
+async def test_user_cache_redis_outage(settings, monkeypatch):
+    """Test the lookups fall through to the loader, and the writes to the LRU, while Redis is unavailable."""
+    monkeypatch.setattr(settings, "USER_CACHE_URL", "redis://127.0.0.1:1/0")
+    cache, loader = make_cache(), CountingLoader()
+
+    assert await cache.get("username", "ann", loader) == UserRecord(1, "ann", "ann@example.com")
+    await cache.set(UserRecord(2, "bob", "bob@example.com"))
+    await cache.invalidate(UserRecord(1, "ann", "ann@example.com"))
+    assert await cache.get("username", "ann", loader) == UserRecord(1, "ann", "ann@example.com")
+
+    assert loader.calls == [["ann"], ["ann"]]
@@ -0,0 +1,64 @@
+"""Test the task status helpers."""
+
+import pytest
+from apis.celery_utils import (
+    TerminalStateCache,
+    enqueue,
+    enqueue_stats,
+    get_task_info_async,
+    get_tasks_info_async,
+    task_state_cache,
+)
+from apis.tasks.users import divide
+from celery import current_app
+
+
+def test_terminal_state_cache_only_keeps_ready_states():
+    """Test pending states are never cached and the LRU bound holds."""
+    cache = TerminalStateCache(maxsize=2, ttl=60)
+    cache.set("pending", {"state": "PENDING"})
+    cache.set("first", {"state": "SUCCESS"})
+    cache.set("second", {"state": "SUCCESS"})
+    cache.set("third", {"state": "FAILURE", "error": "boom"})
+
+    assert cache.get("pending") is None
+    assert cache.get("first") is None
+    assert cache.get("third") == {"state": "FAILURE", "error": "boom"}
+
+
+@pytest.mark.asyncio
+async def test_get_task_info_async_reads_backend(app):  # pylint: disable=unused-argument
+    """Test task info is read from the result backend and cached once final."""
+    task_state_cache.clear()
+    backend = current_app.backend
+    backend.store_result("async-status-task", None, "STARTED")
+    assert await get_task_info_async("async-status-task") == {"state": "STARTED"}
+
+    backend.store_result("async-status-task", ValueError("boom"), "FAILURE")
+    assert await get_task_info_async("async-status-task") == {"state": "FAILURE", "error": "boom"}
+
+    backend.forget("async-status-task")
+    assert await get_task_info_async("async-status-task") == {"state": "FAILURE", "error": "boom"}
+    assert await get_task_info_async("unknown-task") == {"state": "PENDING"}
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_info_async_chunks(app):  # pylint: disable=unused-argument
+    """Test ids spread over several chunks are all resolved."""
+    task_ids = [f"chunked-{i}" for i in range(7)]
+    for task_id in task_ids[:3]:
+        current_app.backend.store_result(task_id, None, "STARTED")
+
+    response = await get_tasks_info_async(task_ids, chunk_size=2)
+    assert list(response) == task_ids
+    assert [info["state"] for info in response.values()] == ["STARTED"] * 3 + ["PENDING"] * 4
+
+
+@pytest.mark.asyncio
+async def test_enqueue_publishes_off_the_loop(app):  # pylint: disable=unused-argument
+    """Test enqueue publishes from a worker thread and records the latency."""
+    count = enqueue_stats.count
+    result = await enqueue(divide.s(6, 3))
+
+    assert result.get() == 2
+    assert enqueue_stats.count == count + 1
@@ -0,0 +1,49 @@
+"""Test the database engines and sessions."""
+
+import pytest
+from apis.database import (
+    engine_options,
+    get_db_read_session,
+    read_engine,
+)
+from apis.models.users import User
+from apis.tasks.base import (
+    get_worker_resources,
+    worker_get,
+)
+
+
+def test_engine_options_sqlite(settings):  # pylint: disable=unused-argument
+    """Test SQLite engines get no pool sizing."""
+    options = engine_options("sqlite+aiosqlite:///db.sqlite3", pool_size=5, max_overflow=5)
+
+    assert "pool_size" not in options
+    assert "statement_cache_size" not in options["connect_args"]
+
+
+def test_engine_options_asyncpg(settings):
+    """Test PostgreSQL engines get the pool and asyncpg cache settings."""
+    options = engine_options("postgresql+asyncpg://user@db/app", pool_size=3, max_overflow=7)
+
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 7
+    assert options["pool_recycle"] == settings.DATABASE_POOL_RECYCLE
+    assert options["pool_pre_ping"] == settings.DATABASE_POOL_PRE_PING
+    assert options["connect_args"]["statement_cache_size"] == settings.DATABASE_STATEMENT_CACHE_SIZE
+
+
+@pytest.mark.asyncio
+async def test_read_session_uses_read_engine(app, db_session):  # pylint: disable=unused-argument
+    """Test the read session dependency and the worker read helper see committed rows."""
+    user = User(username="replica", email="replica@example.com")
+    db_session.add(user)
+    await db_session.commit()
+
+    sessions = get_db_read_session()
+    session = await anext(sessions)
+    assert session.bind is read_engine
+    assert (await session.get(User, user.id)).username == "replica"
+    await sessions.aclose()
+
+    # worker engines are bound to the worker loop
+    assert get_worker_resources().run(worker_get(User, user.id)).email == "replica@example.com"
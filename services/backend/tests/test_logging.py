@@ -0,0 +1,73 @@
+"""Test the logging pipeline."""
+
+import io
+import json
+import logging
+from unittest import mock
+
+import pytest
+from apis.logging import (
+    JsonFormatter,
+    RateLimitFilter,
+    configure_logging,
+    stop_log_listener,
+)
+
+
+@pytest.fixture(name="restore_logging")
+def fixture_restore_logging():
+    """Restore the default logging configuration after the test."""
+    yield
+    configure_logging()
+
+
+def make_record(name: str, msg: str, level: int = logging.INFO) -> logging.LogRecord:
+    """Create a log record."""
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+def test_json_formatter_includes_extra_fields():
+    """Test records are formatted as JSON with their extra fields and traceback."""
+    exc_info = (ValueError, ValueError("boom"), None)
+    record = logging.LogRecord("apis.test", logging.ERROR, __file__, 7, "user %s", ("jane",), exc_info)
+    record.task_id = "task-1"
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["level"] == "ERROR"
+    assert payload["logger"] == "apis.test"
+    assert payload["message"] == "user jane"
+    assert payload["task_id"] == "task-1"
+    assert "ValueError: boom" in payload["exc_info"]
+
+
+def test_rate_limit_filter_limits_each_message():
+    """Test a chatty message is limited without hiding other messages nor warnings."""
+    log_filter = RateLimitFilter({"engineio": (2, 1.0)})
+
+    with mock.patch("apis.logging.time.monotonic", return_value=100.0):
+        passed = [log_filter.filter(make_record("engineio.server", "packet %s")) for _ in range(5)]
+        assert passed == [True, True, False, False, False]
+        assert log_filter.filter(make_record("engineio.server", "connected"))
+        assert log_filter.filter(make_record("engineio.server", "packet %s", logging.WARNING))
+        assert log_filter.filter(make_record("apis.routers", "packet %s"))
+
+    with mock.patch("apis.logging.time.monotonic", return_value=101.5):
+        record = make_record("engineio.server", "packet %s")
+        assert log_filter.filter(record)
+        assert vars(record)["suppressed"] == 3
+
+
+def test_queued_logging_writes_from_listener(restore_logging):  # pylint: disable=unused-argument
+    """Test the queued mode writes JSON records once the listener drained the queue."""
+    stream = io.StringIO()
+    configure_logging(log_format="json", use_queue=True, rate_limits={"apis.heartbeat": (1, 60.0)}, stream=stream)
+
+    for _ in range(3):
+        logging.getLogger("apis.heartbeat").info("tick")
+    logging.getLogger("apis.test").info("user %s", "jane", extra={"request_id": "r-1"})
+    stop_log_listener()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record["message"] for record in records] == ["tick", "user jane"]
+    assert records[1]["request_id"] == "r-1"
@@ -0,0 +1,35 @@
+"""Test the Celery outbox relay."""
+
+from unittest import mock
+
+import pytest
+from apis.models.outbox import OutboxMessage
+from apis.outbox import (
+    enqueue_in_outbox,
+    relay_outbox_batch,
+)
+from apis.tasks.users import task_send_welcome_email
+from sqlalchemy import (
+    func,
+    select,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@pytest.mark.asyncio
+async def test_relay_outbox_batch(db_session: AsyncSession, monkeypatch):
+    """Test the relay publishes committed messages in batches and deletes them."""
+    mock_publish = mock.Mock()
+    monkeypatch.setattr("apis.outbox.publish_outbox_messages", mock_publish)
+    async with db_session.begin():
+        task_ids = [enqueue_in_outbox(db_session, task_send_welcome_email, user_pk) for user_pk in range(3)]
+
+    celery_app = mock.sentinel.celery_app
+    assert await relay_outbox_batch(db_session, celery_app, batch_size=2) == 2
+    assert await relay_outbox_batch(db_session, celery_app, batch_size=2) == 1
+    assert await relay_outbox_batch(db_session, celery_app, batch_size=2) == 0
+
+    published = [message for call in mock_publish.call_args_list for message in call.args[1]]
+    assert published == [(task_id, task_send_welcome_email.name, [pk], {}) for pk, task_id in enumerate(task_ids)]
+    async with db_session.begin():
+        assert await db_session.scalar(select(func.count()).select_from(OutboxMessage)) == 0
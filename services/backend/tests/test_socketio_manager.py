@@ -0,0 +1,44 @@
+"""Test the msgpack Socket.IO managers."""
+
+import pickle
+
+import msgpack
+import redis
+from apis.socketio_manager import (
+    MsgPackRedisManager,
+    unpack_message,
+)
+
+
+def test_unpack_message_passes_other_formats_through():
+    """Test msgpack messages are decoded and pickle or JSON messages left to Socket.IO."""
+    message = {"method": "emit", "event": "status", "data": {"state": "SUCCESS"}, "callback": None}
+    pickled = pickle.dumps(message)
+
+    assert unpack_message(msgpack.packb(message)) == message
+    assert unpack_message(pickled) is pickled
+    assert unpack_message(b'{"method": "emit"}') == b'{"method": "emit"}'
+    assert unpack_message(msgpack.packb([1, 2])) == msgpack.packb([1, 2])
+
+
+def test_emitter_publishes_msgpack(settings):
+    """Test the write-only emitter publishes msgpack messages on the Socket.IO channel."""
+    emitter = MsgPackRedisManager(settings.WS_MESSAGE_QUEUE, write_only=True)
+    subscriber = redis.Redis.from_url(settings.WS_MESSAGE_QUEUE).pubsub(ignore_subscribe_messages=True)
+    subscriber.subscribe(emitter.channel)
+    try:
+        emitter.emit("status", {"state": "SUCCESS"}, room="emitter-task", namespace="/task_status")
+        for _ in range(10):
+            message = subscriber.get_message(timeout=1)
+            if message:
+                break
+    finally:
+        subscriber.close()
+
+    data = unpack_message(message["data"])
+    assert (data["method"], data["event"], data["data"], data["room"]) == (
+        "emit",
+        "status",
+        {"state": "SUCCESS"},
+        "emitter-task",
+    )
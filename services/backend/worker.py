@@ -0,0 +1,14 @@
+"""Entry point of the Celery workers and beat, without the FastAPI app."""
+
+from apis.celery_utils import create_celery
+from apis.logging import configure_logging
+from celery.signals import setup_logging
+
+configure_logging()
+celery = create_celery()
+
+
+@setup_logging.connect
+def setup_celery_logging(**kwargs):  # pylint: disable=unused-argument
+    """Keep the project logging instead of the Celery one in the workers and beat."""
+    configure_logging()